@@ -0,0 +1,150 @@
+"""
+Benchmarks of the links and formats hot paths, and of complete Diamond-Miner runs.
+
+The replies are generated with the simulator, from diamonds wide enough to
+produce the requested number of replies. Usage:
+
+    python benchmarks/benchmark.py --sizes 100 10000 1000000
+"""
+import argparse
+import json
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, Dict, List
+
+from pycaracal import Probe, Reply
+from tabulate import tabulate
+
+from fast_mda_traceroute.algorithms import DiamondMiner, MDALite
+from fast_mda_traceroute.formats import format_scamper_json, format_table
+from fast_mda_traceroute.links import (
+    get_links_by_ttl,
+    get_pairs_by_flow,
+    get_scamper_links,
+)
+from fast_mda_traceroute.replies import ReplyStore
+from fast_mda_traceroute.runner import run
+from fast_mda_traceroute.simulator import SimulatedProber, Topology
+from fast_mda_traceroute.typing import Protocol
+
+DIAMOND_LENGTH = 8
+DIAMOND_TTLS = DIAMOND_LENGTH + 3
+DST_ADDR = "192.0.2.1"
+
+
+def generate_replies(n_replies: int) -> List[Reply]:
+    """`n_replies` time-exceeded replies, from all the TTLs of a diamond."""
+    n_flows = max(n_replies // DIAMOND_TTLS, 1)
+    topology = Topology.diamond(min(n_flows, 1024), DIAMOND_LENGTH, meshed=True)
+    prober = SimulatedProber(topology, probing_rate=10**9)
+    probes = [
+        Probe(DST_ADDR, 1024 + flow % 64511, 33434 + flow // 64511, ttl, "icmp")
+        for flow in range(n_flows)
+        for ttl in range(1, DIAMOND_TTLS + 1)
+    ]
+    return prober.probe(probes[:n_replies], 1000)
+
+
+def measure(fn: Callable, repeat: int) -> Dict[str, float]:
+    """Best wall time over `repeat` runs, and peak memory of a separate run."""
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        times.append(perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"time": min(times), "memory": peak / 2**20}
+
+
+def benchmark_replies(replies: List[Reply], repeat: int) -> Dict[str, Dict]:
+    now = datetime.now()
+    probes_sent = {
+        ttl: len(replies) // DIAMOND_TTLS for ttl in range(1, DIAMOND_TTLS + 1)
+    }
+    store = ReplyStore(replies)
+    fns = {
+        "ReplyStore": lambda: ReplyStore(replies),
+        "get_links_by_ttl": lambda: get_links_by_ttl(replies),
+        "get_links_by_ttl (store)": lambda: get_links_by_ttl(store),
+        "get_pairs_by_flow": lambda: get_pairs_by_flow(replies),
+        "get_scamper_links": lambda: get_scamper_links(replies),
+        "format_scamper_json": lambda: format_scamper_json(
+            95,
+            100,
+            "localhost",
+            "192.0.2.0",
+            DST_ADDR,
+            Protocol.ICMP,
+            1,
+            24000,
+            33434,
+            1000,
+            now,
+            now,
+            probes_sent,
+            replies,
+        ),
+        "format_table": lambda: format_table(replies),
+    }
+    return {name: measure(fn, repeat) for name, fn in fns.items()}
+
+
+def benchmark_algorithm(algorithm: type, width: int, repeat: int) -> Dict:
+    topology = Topology.diamond(width, DIAMOND_LENGTH, meshed=True)
+    result = {}
+
+    def fn():
+        prober = SimulatedProber(topology, probing_rate=10**6)
+        alg = algorithm(DST_ADDR, 1, 32, 24000, 33434, "icmp", 95, 10)
+        run(prober, [alg], 10**6, 1000)
+        result["rounds"] = alg.current_round
+        result["probes"] = prober.probes_sent
+        result["links"] = len(alg.links)
+
+    result.update(measure(fn, repeat))
+    result["probes_per_link"] = result["probes"] / max(result["links"], 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 10000, 100000, 1000000],
+        help="Number of replies.",
+    )
+    parser.add_argument(
+        "--widths",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, 16],
+        help="Width of the diamonds for the algorithms benchmarks.",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Output JSON.")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        replies = generate_replies(size)
+        for name, result in benchmark_replies(replies, args.repeat).items():
+            results.append({"benchmark": name, "size": len(replies), **result})
+    for algorithm in (DiamondMiner, MDALite):
+        for width in args.widths:
+            result = benchmark_algorithm(algorithm, width, args.repeat)
+            results.append({"benchmark": algorithm.__name__, "size": width, **result})
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(tabulate(results, headers="keys", floatfmt=".3f"))
+
+
+if __name__ == "__main__":
+    main()
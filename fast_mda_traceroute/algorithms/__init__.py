@@ -1,3 +1,4 @@
 from fast_mda_traceroute.algorithms.diamond_miner import DiamondMiner
+from fast_mda_traceroute.algorithms.mda_lite import MDALite
 
-__all__ = ("DiamondMiner",)
+__all__ = ("DiamondMiner", "MDALite")
@@ -1,17 +1,74 @@
-from collections import defaultdict
-from random import shuffle
-from typing import Dict, List, Set
+from collections import Counter, defaultdict, deque
+from ipaddress import ip_network
+from math import ceil, sqrt
+from time import perf_counter
+from typing import Deque, Dict, List, Optional, Sequence, Set, Tuple
 
-from diamond_miner.generators import probe_generator
-from diamond_miner.mappers import SequentialFlowMapper
 from diamond_miner.mda import stopping_point
-from diamond_miner.typing import Probe
-from more_itertools import flatten
-from pycaracal import Reply
+from more_itertools import map_reduce
+from pycaracal import Probe, Reply
 
-from fast_mda_traceroute.links import get_links_by_ttl
-from fast_mda_traceroute.typing import Link
-from fast_mda_traceroute.utils import is_ipv4
+from fast_mda_traceroute.checkpoint import Checkpoint, format_probe
+from fast_mda_traceroute.flows import MultiFlowMapper
+from fast_mda_traceroute.links import LinkIndex
+from fast_mda_traceroute.logger import logger
+from fast_mda_traceroute.probes import build_probes, schedule_flows
+from fast_mda_traceroute.replies import ReplyStore, StoredReply, pack_addr, unpack_addr
+from fast_mda_traceroute.typing import Flow, Link
+from fast_mda_traceroute.utils import is_ipv4, percentile
+
+# Adaptive wait: `factor` times the `percentile` of the RTTs, plus `margin` milliseconds.
+ADAPTIVE_WAIT_PERCENTILE = 95
+ADAPTIVE_WAIT_FACTOR = 2
+ADAPTIVE_WAIT_MARGIN = 50
+# Number of most recent RTTs kept at each TTL for the adaptive wait.
+ADAPTIVE_WAIT_WINDOW = 128
+
+# Number of consecutive unresponsive TTLs after which the TTL range is no longer extended.
+GAP_LIMIT = 5
+
+# Number of answered flows probed again at each TTL, to detect per-packet load balancing.
+PER_PACKET_FLOWS = 2
+
+# Rate limiting detection: minimum number of probes at a TTL to compare the reply rates
+# of the first and the second half of its probes, maximum ratio between these rates,
+# and minimum z-score of the difference between these rates.
+RATE_LIMIT_MIN_PROBES = 16
+RATE_LIMIT_DROP = 0.5
+RATE_LIMIT_Z = 3.0
+# Minimum number of probes per round at a rate-limited TTL.
+RATE_LIMIT_MIN_CAP = 1
+# Minimum number of times an unanswered probe is sent again at a rate-limited TTL.
+RATE_LIMIT_RETRIES = 2
+
+# Default maximum number of times an unanswered probe is sent again.
+RETRIES = 0
+
+# Maximum number of addresses probed in a prefix (e.g. the first 256 addresses of a /64).
+MAX_PREFIX_SIZE = 256
+
+
+def reply_rate_drop(replied: Sequence[bool]) -> bool:
+    """
+    Whether the reply rate dropped significantly between the first and the second
+    half of the probes, in the order they were sent.
+    >>> reply_rate_drop([True] * 10 + [False] * 6)
+    True
+    >>> reply_rate_drop([True, True, True, False] * 4)
+    False
+    >>> reply_rate_drop([True] * 6 + [False] * 4)
+    False
+    """
+    if len(replied) < RATE_LIMIT_MIN_PROBES:
+        return False
+    half = len(replied) // 2
+    first_rate = sum(replied[:half]) / half
+    second_rate = sum(replied[half:]) / (len(replied) - half)
+    if second_rate >= RATE_LIMIT_DROP * first_rate:
+        return False
+    rate = sum(replied) / len(replied)
+    error = sqrt(rate * (1 - rate) * (1 / half + 1 / (len(replied) - half)))
+    return first_rate - second_rate >= RATE_LIMIT_Z * error
 
 
 class DiamondMiner:
@@ -27,80 +84,484 @@ class DiamondMiner:
         protocol: str,
         confidence: int,
         max_round: int,
+        *,
+        initial_max_ttl: Optional[int] = None,
+        checkpoint: Optional[Checkpoint] = None,
+        prior_links_by_ttl: Optional[Dict[int, Set[Link]]] = None,
+        src_port_count: Optional[int] = None,
+        dst_port_count: int = 1,
+        prefix_len: Optional[int] = None,
+        retries: int = RETRIES,
     ):
+        # With `prefix_len`, the flows are spread over the addresses of the prefix.
+        prefix_size = 1
+        if prefix_len is not None:
+            network = ip_network(f"{dst_addr}/{prefix_len}", strict=False)
+            dst_addr = str(network.network_address)
+            prefix_size = min(network.num_addresses, MAX_PREFIX_SIZE)
         if protocol == "icmp" and not is_ipv4(dst_addr):
             protocol = "icmp6"
+        if protocol != "udp":
+            # The destination port is not part of the flow ID of ICMP probes.
+            dst_port_count = 1
+        max_port = max(src_port + (src_port_count or 1), dst_port + dst_port_count)
+        if max_port > 65536:
+            raise ValueError("The port ranges must be within 0-65535.")
         self.failure_probability = 1 - (confidence / 100)
         self.dst_addr = dst_addr
+        self.prefix_len = prefix_len
         self.min_ttl = min_ttl
         self.max_ttl = max_ttl
+        # At least the first TTL is probed in the first round.
+        self.initial_max_ttl = min(max(initial_max_ttl or max_ttl, min_ttl), max_ttl)
         self.src_port = src_port
         self.dst_port = dst_port
         self.protocol = protocol
-        self.mapper_v4 = SequentialFlowMapper(prefix_size=1)
-        self.mapper_v6 = SequentialFlowMapper(prefix_size=1)
+        # By default all the source ports above `src_port` are used.
+        self.mapper = MultiFlowMapper(
+            prefix_size, src_port_count or 65536 - src_port, dst_port_count
+        )
         self.max_round = max_round
+        self.checkpoint = checkpoint
+        self.prior_links_by_ttl = prior_links_by_ttl or {}
+        self.retries = retries
         # Diamond-Miner state
         self.current_round = 0
         self.probes_sent: Dict[int, int] = defaultdict(int)
-        self.replies_by_round: Dict[int, List[Reply]] = {}
+        self.replies = ReplyStore()
+        # The ICMP time exceeded replies, also stored apart for the outputs.
+        self.time_exceeded_replies = ReplyStore()
+        self.link_index = LinkIndex()
+        self.rtts_by_ttl: Dict[int, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=ADAPTIVE_WAIT_WINDOW)
+        )
+        self.round_ttls: Set[int] = set()
+        self.destination_ttl: Optional[int] = None
+        self.destination_ttls: Dict[str, int] = {}
+        self.max_replied_ttl = 0
+        self.max_probed_ttl = 0
+        self.round_probes: List[Probe] = []
+        self.round_links: Set[Link] = set()
+        self.round_removed_links: Set[Link] = set()
+        # TTLs at which the flow budget exceeded the number of flow IDs.
+        self.exhausted_ttls: Set[int] = set()
+        # Per-packet load balancing detection: the first flows answered at each TTL,
+        # which are probed again, and the TTLs at which they got different replies.
+        self.sampled_flows_by_ttl: Dict[int, Dict[Flow, int]] = defaultdict(dict)
+        self.probes_resent: Dict[int, int] = defaultdict(int)
+        self.per_packet_ttls: Set[int] = set()
+        # The flows sent at each TTL in the last round, in order, and the TTLs that
+        # sent ICMP time exceeded replies.
+        self.round_flows_by_ttl: Dict[int, List[int]] = {}
+        self.time_exceeded_ttls: Set[int] = set()
+        # Retries: the unanswered flows to send again at each TTL, the number of
+        # times each (TTL, flow ID) has been sent again, and the TTLs at which a flow
+        # sent again was still unanswered (an unresponsive interface).
+        self.lost_flows_by_ttl: Dict[int, List[int]] = {}
+        self.retransmissions: Counter[Tuple[int, int]] = Counter()
+        self.silent_ttls: Set[int] = set()
+        # Rate limiting: the TTLs at which it was detected, and the cap on the number
+        # of probes per round at the TTLs still rate-limited.
+        self.rate_limited_ttls: Set[int] = set()
+        self.ttl_caps: Dict[int, int] = {}
+        # The flow budget of each TTL computed in the last round.
+        self.round_budgets: Dict[int, int] = {}
+        # Time spent in each phase of the last round, in seconds.
+        self.round_timings: Dict[str, float] = {}
 
     @property
     def links_by_ttl(self) -> Dict[int, Set[Link]]:
-        return get_links_by_ttl(self.time_exceeded_replies)
+        return self.link_index.links_by_ttl
 
     @property
     def links(self) -> Set[Link]:
-        return set(flatten(self.links_by_ttl.values()))
+        return self.link_index.links
 
     @property
-    def replies(self) -> List[Reply]:
-        return list(flatten(self.replies_by_round.values()))
+    def dst_addrs(self) -> List[str]:
+        """The probed addresses: `dst_addr`, or the addresses of its prefix."""
+        prefix = pack_addr(self.dst_addr)
+        return [unpack_addr(prefix + i) for i in range(self.mapper.prefix_size)]
 
-    @property
-    def time_exceeded_replies(self) -> List[Reply]:
-        return [x for x in self.replies if x.time_exceeded]
+    def links_by_dst(self) -> Dict[str, Set[Link]]:
+        """The links observed with the probes towards each address."""
+        links_by_dst: Dict[str, Set[Link]] = defaultdict(set)
+        for flow, links in self.link_index.links_by_flow.items():
+            links_by_dst[flow[1]].update(links)
+        return links_by_dst
+
+    def probes_sent_by_dst(self) -> Dict[str, Dict[int, int]]:
+        """The number of probes sent at each TTL towards each address."""
+        # The flow IDs are sequential and the address is their fastest-varying dimension.
+        size = self.mapper.prefix_size
+        return {
+            dst_addr: {
+                ttl: max(ceil((count - offset) / size), 0)
+                for ttl, count in self.probes_sent.items()
+            }
+            for offset, dst_addr in enumerate(self.dst_addrs)
+        }
+
+    def time_exceeded_replies_by_dst(self) -> Dict[str, List[StoredReply]]:
+        """The ICMP time exceeded replies to the probes towards each address."""
+        return map_reduce(self.time_exceeded_replies, lambda x: x.probe_dst_addr)
+
+    def adaptive_wait(self, max_wait: int) -> int:
+        """
+        Time in milliseconds to wait for the replies to the probes of the current round,
+        based on the last RTTs observed at the probed TTLs, and bounded by `max_wait`.
+        If some of the probed TTLs have no RTT yet, the RTTs of all the TTLs are considered.
+        """
+        ttls = self.round_ttls
+        if not ttls.issubset(self.rtts_by_ttl):
+            ttls = set(self.rtts_by_ttl)
+        if not ttls:
+            return max_wait
+        rtt = max(
+            percentile(self.rtts_by_ttl[ttl], ADAPTIVE_WAIT_PERCENTILE) for ttl in ttls
+        )
+        return min(max_wait, ceil(ADAPTIVE_WAIT_FACTOR * rtt + ADAPTIVE_WAIT_MARGIN))
+
+    def link_budget(self, ttl: int, links: Set[Link]) -> int:
+        """
+        Number of flows to send at `ttl` to discover, with the desired confidence,
+        all the links between `ttl` and `ttl + 1`.
+        """
+        return stopping_point(len(links) + 1, self.failure_probability)
+
+    def budget_links_by_ttl(self) -> Dict[int, Set[Link]]:
+        """The links discovered so far that the flow budgets are based on."""
+        # The links to and from the TTLs behind a per-packet load balancer are
+        # not stable, their budgets are not increased anymore.
+        unstable_ttls = {ttl - 1 for ttl in self.per_packet_ttls}
+        unstable_ttls |= self.per_packet_ttls
+        links_by_ttl = {
+            ttl: links
+            for ttl, links in self.link_index.links_by_ttl.items()
+            if ttl not in unstable_ttls
+        }
+        # The links to and from a TTL with an unknown address, at the TTLs
+        # rate-limited, are likely lost replies.
+        for ttl in self.ttl_caps:
+            for near_ttl in (ttl - 1, ttl):
+                if near_ttl in links_by_ttl:
+                    links_by_ttl[near_ttl] = {
+                        link for link in links_by_ttl[near_ttl] if all(link)
+                    }
+        return links_by_ttl
+
+    def max_flow_by_ttl(
+        self, links_by_ttl: Optional[Dict[int, Set[Link]]] = None
+    ) -> Dict[int, int]:
+        """
+        Number of flows to send at each TTL, given the links discovered so far
+        (or `links_by_ttl`).
+        Since a link between `ttl` and `ttl + 1` is only observed when both TTLs
+        reply to the same flow, a TTL must be probed with the maximum of the budgets
+        of the links on its both sides (cf. Diamond-Miner paper `Proposition 1`).
+        """
+        if links_by_ttl is None:
+            links_by_ttl = self.budget_links_by_ttl()
+        budgets = {
+            ttl: self.link_budget(ttl, links) for ttl, links in links_by_ttl.items()
+        }
+        ttls = set(budgets) | {ttl + 1 for ttl in budgets if ttl < self.max_ttl}
+        return {ttl: max(budgets.get(ttl - 1, 0), budgets.get(ttl, 0)) for ttl in ttls}
+
+    def extend_ttl_range(self) -> bool:
+        """
+        Whether the destination may be beyond the probed TTLs: it has not replied yet,
+        and the path did not go silent for `GAP_LIMIT` TTLs.
+        """
+        if self.destination_ttl or self.max_probed_ttl >= self.max_ttl:
+            return False
+        return self.max_replied_ttl > self.max_probed_ttl - GAP_LIMIT
+
+    def detect_per_packet(self) -> None:
+        """Flag the TTLs at which a sampled flow got replies from different addresses."""
+        addrs_by_flow = self.link_index.addrs_by_flow
+        for ttl, flows in self.sampled_flows_by_ttl.items():
+            if ttl in self.per_packet_ttls:
+                continue
+            if any(len(addrs_by_flow[flow][ttl]) > 1 for flow in flows):
+                logger.warning(
+                    "dst_addr=%s ttl=%d message=per-packet load balancing detected",
+                    self.dst_addr,
+                    ttl,
+                )
+                self.per_packet_ttls.add(ttl)
+
+    def round_outcomes(self, replies: List[Reply]) -> Dict[int, List[bool]]:
+        """Whether each flow sent at each TTL in the last round was answered, in order."""
+        answered = map_reduce(replies, lambda x: x.probe_ttl, self.flow_id, set)
+        return {
+            ttl: [flow_id in answered.get(ttl, ()) for flow_id in flows]
+            for ttl, flows in self.round_flows_by_ttl.items()
+        }
+
+    def detect_rate_limiting(self, outcomes: Dict[int, List[bool]]) -> None:
+        """
+        Cap the number of probes per round at the TTLs whose reply rate dropped
+        in the last round, and remove the caps once all the probes are answered.
+        """
+        for ttl in outcomes.keys() | self.ttl_caps.keys():
+            replied = outcomes.get(ttl, [])
+            replies_count = sum(replied)
+            cap = self.ttl_caps.get(ttl)
+            if reply_rate_drop(replied):
+                if ttl not in self.ttl_caps:
+                    logger.warning(
+                        "dst_addr=%s ttl=%d message=rate limiting detected",
+                        self.dst_addr,
+                        ttl,
+                    )
+                    self.rate_limited_ttls.add(ttl)
+                if cap:
+                    replies_count = min(replies_count, cap // 2)
+                self.ttl_caps[ttl] = max(replies_count, RATE_LIMIT_MIN_CAP)
+            elif cap:
+                if replies_count < len(replied):
+                    self.ttl_caps[ttl] = max(replies_count, RATE_LIMIT_MIN_CAP)
+                elif len(replied) < cap and not self.lost_flows_by_ttl.get(ttl):
+                    logger.info(
+                        "dst_addr=%s ttl=%d message=rate limiting cleared",
+                        self.dst_addr,
+                        ttl,
+                    )
+                    del self.ttl_caps[ttl]
+                else:
+                    self.ttl_caps[ttl] = 2 * cap
+
+    def schedule_retries(self, outcomes: Dict[int, List[bool]]) -> None:
+        """
+        Schedule the unanswered flows of the last round to be sent again, up to
+        `retries` times, at the TTLs that replied to other probes, up to the
+        destination, until a flow sent again is still unanswered.
+        """
+        for ttl, replied in outcomes.items():
+            if ttl not in self.time_exceeded_ttls or ttl in self.per_packet_ttls:
+                continue
+            if self.destination_ttl and ttl >= self.destination_ttl:
+                continue
+            lost_flows = self.lost_flows_by_ttl.setdefault(ttl, [])
+            rate_limited = ttl in self.rate_limited_ttls
+            retries = (
+                max(self.retries, RATE_LIMIT_RETRIES) if rate_limited else self.retries
+            )
+            for flow_id, ok in zip(self.round_flows_by_ttl[ttl], replied):
+                if ok:
+                    continue
+                retransmissions = self.retransmissions[ttl, flow_id]
+                if retransmissions and not rate_limited:
+                    self.silent_ttls.add(ttl)
+                if ttl in self.silent_ttls:
+                    continue
+                if retransmissions < retries:
+                    lost_flows.append(flow_id)
+            if ttl in self.silent_ttls:
+                lost_flows.clear()
+
+    def flow_id(self, reply: Reply) -> int:
+        """Flow ID of the probe of a reply."""
+        return self.probe_flow_id(
+            reply.probe_dst_addr, reply.probe_src_port, reply.probe_dst_port
+        )
+
+    def probe_flow_id(self, dst_addr: str, src_port: int, dst_port: int) -> int:
+        """Flow ID of a probe."""
+        return self.mapper.flow_id(
+            pack_addr(dst_addr) - pack_addr(self.dst_addr),
+            src_port - self.src_port,
+            dst_port - self.dst_port if self.protocol == "udp" else 0,
+        )
+
+    def resume(self, checkpoint: Checkpoint) -> List[Probe]:
+        """
+        Replay the rounds recorded in the checkpoint, and return the probes of the
+        round following the last completed one.
+        """
+        self.checkpoint = None
+        try:
+            probes = self.next_round([])
+            records = checkpoint.read(self.dst_addr)
+            for record in records:
+                if not probes:
+                    break
+                if record["round"] != self.current_round or sorted(
+                    record["probes"]
+                ) != sorted(format_probe(x) for x in probes):
+                    raise ValueError(
+                        f"{checkpoint.path} does not match the trace towards {self.dst_addr}"
+                    )
+                # The flows are sent in a random order, the rate limiting detection
+                # depends on the order in which they were actually sent.
+                self.round_flows_by_ttl = map_reduce(
+                    record["probes"],
+                    lambda x: x[3],
+                    lambda x: self.probe_flow_id(x[0], x[1], x[2]),
+                )
+                probes = self.next_round(record["replies"])
+        finally:
+            self.checkpoint = checkpoint
+        if records:
+            logger.info(
+                "dst_addr=%s resumed_rounds=%d", self.dst_addr, self.current_round - 1
+            )
+        return probes
 
     def next_round(self, replies: List[Reply]) -> List[Probe]:
+        if self.checkpoint:
+            if not self.current_round:
+                return self.resume(self.checkpoint)
+            self.checkpoint.write(
+                self.dst_addr, self.current_round, self.round_probes, replies
+            )
+        start_time = perf_counter()
         self.current_round += 1
-        self.replies_by_round[self.current_round] = replies
+        self.replies.extend(replies)
+        self.time_exceeded_replies.extend(x for x in replies if x.time_exceeded)
+        for reply in replies:
+            self.rtts_by_ttl[reply.probe_ttl].append(reply.rtt / 10)
+            if reply.echo_reply or reply.destination_unreachable:
+                self.destination_ttls[reply.probe_dst_addr] = min(
+                    self.destination_ttls.get(reply.probe_dst_addr, reply.probe_ttl),
+                    reply.probe_ttl,
+                )
+                if self.prefix_len is None:
+                    self.destination_ttl = self.destination_ttls[reply.probe_dst_addr]
+            elif reply.time_exceeded:
+                self.max_replied_ttl = max(self.max_replied_ttl, reply.probe_ttl)
+                self.time_exceeded_ttls.add(reply.probe_ttl)
+                sampled_flows = self.sampled_flows_by_ttl[reply.probe_ttl]
+                if len(sampled_flows) < PER_PACKET_FLOWS:
+                    flow = (
+                        reply.probe_protocol,
+                        reply.probe_dst_addr,
+                        reply.probe_src_port,
+                        reply.probe_dst_port,
+                    )
+                    sampled_flows.setdefault(flow, self.flow_id(reply))
+        if self.prefix_len is not None and self.destination_ttls:
+            # In prefix mode, the addresses may be at different distances: the probes
+            # stop at the farthest one, unless a router replied at or beyond it.
+            farthest_ttl = max(self.destination_ttls.values())
+            if self.max_replied_ttl < farthest_ttl:
+                self.destination_ttl = farthest_ttl
+            else:
+                self.destination_ttl = None
+        self.round_links, self.round_removed_links = self.link_index.add(
+            x for x in replies if x.time_exceeded
+        )
+        self.detect_per_packet()
+        outcomes = self.round_outcomes(replies)
+        self.detect_rate_limiting(outcomes)
+        self.schedule_retries(outcomes)
+        links_time = perf_counter()
+        self.round_timings = {"links": links_time - start_time, "probes": 0.0}
+        self.round_budgets = self.max_flow_by_ttl()
 
         if self.current_round > self.max_round:
             return []
 
         if self.current_round == 1:
-            # TODO: Iteratively find the destination TTL (with a single flow?).
-            # max_flow = stopping_point(2, self.failure_probability)
-            max_flow = 1
+            # Single flow sweep up to `initial_max_ttl`, the TTL range is then
+            # extended in the next rounds until the destination is found.
+            self.max_probed_ttl = self.initial_max_ttl
             flows_by_ttl = {
-                ttl: range(max_flow) for ttl in range(self.min_ttl, self.max_ttl + 1)
+                ttl: range(1) for ttl in range(self.min_ttl, self.max_probed_ttl + 1)
             }
+            if self.prior_links_by_ttl:
+                # Warm start: send right away the budget of the links known from a
+                # previous trace, the next rounds only verify and extend them.
+                prior_flows = self.max_flow_by_ttl(self.prior_links_by_ttl)
+                for ttl, max_flow in prior_flows.items():
+                    if self.min_ttl <= ttl <= self.max_ttl:
+                        flows_by_ttl[ttl] = range(max_flow)
+                        self.max_probed_ttl = max(self.max_probed_ttl, ttl)
         else:
-            # TODO: Detect loop+amplification
-            flows_by_ttl = {}
-            for ttl, links in self.links_by_ttl.items():
-                # TODO: Full/Lite MDA; see Multilevel MDA-Lite paper.
-                max_flow = stopping_point(len(links) + 1, self.failure_probability)
-                flows_by_ttl[ttl] = range(self.probes_sent[ttl], max_flow)
-            # TODO: Maximum over TTL (h-1, h); cf. Diamond-Miner paper `Proposition 1`.
-
-        probes = []
+            flows_by_ttl = {
+                ttl: range(self.probes_sent[ttl], max_flow)
+                for ttl, max_flow in self.round_budgets.items()
+            }
+            if self.extend_ttl_range():
+                window = self.initial_max_ttl - self.min_ttl + 1
+                min_ttl = self.max_probed_ttl + 1
+                self.max_probed_ttl = min(self.max_probed_ttl + window, self.max_ttl)
+                for ttl in range(min_ttl, self.max_probed_ttl + 1):
+                    flows_by_ttl[ttl] = range(1)
+
+        if self.destination_ttl:
+            # Do not probe past the destination.
+            flows_by_ttl = {
+                ttl: flows
+                for ttl, flows in flows_by_ttl.items()
+                if ttl <= self.destination_ttl
+            }
+
         for ttl, flows in flows_by_ttl.items():
-            probes_for_ttl = list(
-                probe_generator(
-                    [(self.dst_addr, self.protocol)],
-                    flow_ids=flows,
-                    ttls=[ttl],
-                    prefix_len_v4=32,
-                    prefix_len_v6=128,
-                    probe_src_port=self.src_port,
-                    probe_dst_port=self.dst_port,
-                    mapper_v4=self.mapper_v4,
-                    mapper_v6=self.mapper_v6,
+            if flows.stop > self.mapper.size:
+                flows_by_ttl[ttl] = range(
+                    min(flows.start, self.mapper.size), self.mapper.size
                 )
+                if ttl not in self.exhausted_ttls:
+                    logger.warning(
+                        "dst_addr=%s ttl=%d flow_budget=%d flow_ids=%d message=flow ID space exhausted",
+                        self.dst_addr,
+                        ttl,
+                        flows.stop,
+                        self.mapper.size,
+                    )
+                    self.exhausted_ttls.add(ttl)
+
+        # The unanswered flows are sent again first, and then the new flows.
+        # At the rate-limited TTLs, up to the cap of the TTL, the others are deferred.
+        resent_flows_by_ttl: Dict[int, Set[int]] = defaultdict(set)
+        for ttl, lost_flows in self.lost_flows_by_ttl.items():
+            cap = self.ttl_caps.get(ttl, len(lost_flows))
+            self.lost_flows_by_ttl[ttl] = lost_flows[cap:]
+            for flow_id in lost_flows[:cap]:
+                resent_flows_by_ttl[ttl].add(flow_id)
+                self.retransmissions[ttl, flow_id] += 1
+        for ttl, cap in self.ttl_caps.items():
+            if ttl in flows_by_ttl:
+                budget = max(cap - len(resent_flows_by_ttl.get(ttl, ())), 0)
+                flows_by_ttl[ttl] = flows_by_ttl[ttl][:budget]
+        for ttl, flows in flows_by_ttl.items():
+            self.probes_sent[ttl] += len(flows)
+
+        # While the flow budget of a TTL with multiple interfaces grows, probe again
+        # its sampled flows: a per-packet load balancer replies from different addresses.
+        if self.current_round > 1:
+            near_addrs_by_ttl = map_reduce(
+                (x for x in self.links if x[1]), lambda x: x[0], lambda x: x[1], set
             )
-            self.probes_sent[ttl] += len(probes_for_ttl)
-            probes.extend(probes_for_ttl)
+            for ttl, flows in flows_by_ttl.items():
+                if flows and ttl not in self.per_packet_ttls:
+                    if len(near_addrs_by_ttl.get(ttl, ())) > 1:
+                        resent_flows_by_ttl[ttl].update(
+                            self.sampled_flows_by_ttl[ttl].values()
+                        )
+
+        round_flows_by_ttl: Dict[int, Sequence[int]] = dict(flows_by_ttl)
+        for ttl, flow_ids in resent_flows_by_ttl.items():
+            self.probes_resent[ttl] += len(flow_ids)
+            round_flows_by_ttl[ttl] = sorted(flow_ids.union(flows_by_ttl.get(ttl, ())))
+        # The flows sent at each TTL, in the order they are sent.
+        round_flows = schedule_flows(round_flows_by_ttl, self.ttl_caps.keys())
+        self.round_flows_by_ttl = map_reduce(
+            round_flows, lambda x: x[0], lambda x: x[1]
+        )
+        self.round_ttls = set(self.round_flows_by_ttl)
+
+        probes = build_probes(
+            self.dst_addr,
+            self.protocol,
+            self.src_port,
+            self.dst_port,
+            round_flows,
+            self.mapper,
+        )
 
-        shuffle(probes)
+        self.round_probes = probes
+        self.round_timings["probes"] = perf_counter() - links_time
         return probes
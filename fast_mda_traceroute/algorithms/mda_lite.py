@@ -0,0 +1,218 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from diamond_miner.mda import stopping_point
+from pycaracal import Probe, Reply
+
+from fast_mda_traceroute.algorithms.diamond_miner import DiamondMiner
+from fast_mda_traceroute.logger import logger
+from fast_mda_traceroute.typing import Link
+
+# Meshing test: number of flows traced from each vertex of a hop pair to the next hop,
+# and back from each vertex of the next hop, before the hop pair is deemed unmeshed.
+MESHING_TEST_FLOWS = 2
+
+
+class MDALite(DiamondMiner):
+    """
+    MDA-Lite (cf. Multilevel MDA-Lite paper): the number of flows at a TTL depends
+    on the number of vertices discovered at this TTL, instead of the number of links
+    on its both sides. The hops with a single vertex are only probed with the flows
+    needed to rule out a second vertex, and their links to the neighbouring hops
+    are inferred.
+    Between two hops with multiple vertices, the flows are traced hop by hop until
+    each vertex is traversed by `MESHING_TEST_FLOWS` flows (up to the budget of the
+    links). If the hop pair is meshed, its links cannot be inferred from its vertices,
+    and the Diamond-Miner (per-link) budget is used from then on.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The hop pairs found to be meshed, by near TTL.
+        self.meshed_ttls: Set[int] = set()
+
+    @property
+    def links_by_ttl(self) -> Dict[int, Set[Link]]:
+        """
+        The links discovered so far, with the links to and from the hops with
+        a single vertex inferred (the flows are not traced through these hops).
+        """
+        vertices_by_ttl = get_vertices_by_ttl(self.link_index.links)
+        links_by_ttl = {}
+        for ttl, links in self.link_index.links_by_ttl.items():
+            near_addrs = vertices_by_ttl.get(ttl, set())
+            far_addrs = vertices_by_ttl.get(ttl + 1, set())
+            stable = not {ttl, ttl + 1} & self.per_packet_ttls
+            if stable and min(len(near_addrs), len(far_addrs)) == 1:
+                links = {(ttl, near, far) for near in near_addrs for far in far_addrs}
+            links_by_ttl[ttl] = links
+        return links_by_ttl
+
+    @property
+    def links(self) -> Set[Link]:
+        return set().union(*self.links_by_ttl.values())
+
+    def next_round(self, replies: List[Reply]) -> List[Probe]:
+        old_links = self.links
+        probes = super().next_round(replies)
+        # The links added and removed by the round, with the inferred links.
+        new_links = self.links
+        self.round_links = new_links - old_links
+        self.round_removed_links = old_links - new_links
+        return probes
+
+    def vertex_budget(self, n_vertices: int) -> int:
+        """
+        Number of flows to send at a TTL to discover, with the desired confidence,
+        all its vertices. A TTL without replies counts as a single (unknown) vertex.
+        """
+        return stopping_point(max(n_vertices, 1) + 1, self.failure_probability)
+
+    def test_meshing(
+        self,
+        links_by_ttl: Dict[int, Set[Link]],
+        vertices_by_ttl: Dict[int, Set[str]],
+    ) -> Dict[int, int]:
+        """
+        Flag the hop pairs with multiple vertices on both sides that are meshed,
+        given the links traced so far, and return the number of flows missing at
+        the others for each of their vertices to be traced `MESHING_TEST_FLOWS` times.
+        """
+        tested_ttls = {
+            ttl
+            for ttl in links_by_ttl.keys() - self.meshed_ttls
+            if min(len(vertices_by_ttl.get(x, ())) for x in (ttl, ttl + 1)) > 1
+        }
+        if not tested_ttls:
+            return {}
+        out_flows, in_flows = get_traced_flows(
+            self.link_index.links_by_flow.values(), tested_ttls
+        )
+        missing_flows = {}
+        for ttl in sorted(tested_ttls):
+            if is_meshed(links_by_ttl[ttl]):
+                logger.info(
+                    "dst_addr=%s ttl=%d message=meshed hop pair", self.dst_addr, ttl
+                )
+                self.meshed_ttls.add(ttl)
+                continue
+            missing = sum(
+                max(MESHING_TEST_FLOWS - out_flows[ttl, addr], 0)
+                for addr in vertices_by_ttl[ttl]
+            )
+            missing += sum(
+                max(MESHING_TEST_FLOWS - in_flows[ttl, addr], 0)
+                for addr in vertices_by_ttl[ttl + 1]
+            )
+            missing_flows[ttl] = missing
+        return missing_flows
+
+    def pair_budget(
+        self,
+        ttl: int,
+        links: Set[Link],
+        vertices_by_ttl: Dict[int, Set[str]],
+        missing_flows: Dict[int, int],
+    ) -> int:
+        """
+        Number of flows to trace between `ttl` and `ttl + 1`: none if one of the
+        hops has a single vertex (the links are inferred), the vertex budget of the
+        widest hop if the hop pair is not meshed, extended for the meshing test,
+        and the Diamond-Miner budget otherwise.
+        """
+        n_near = len(vertices_by_ttl.get(ttl, ()))
+        n_far = len(vertices_by_ttl.get(ttl + 1, ()))
+        if min(n_near, n_far) <= 1:
+            return 0
+        if ttl in self.meshed_ttls:
+            return self.link_budget(ttl, links)
+        budget = self.vertex_budget(max(n_near, n_far))
+        if missing_flows.get(ttl):
+            traced = min(self.probes_sent[ttl], self.probes_sent[ttl + 1])
+            budget = max(
+                budget,
+                min(traced + missing_flows[ttl], self.link_budget(ttl, links)),
+            )
+        return budget
+
+    def max_flow_by_ttl(
+        self, links_by_ttl: Optional[Dict[int, Set[Link]]] = None
+    ) -> Dict[int, int]:
+        """
+        Number of flows to send at each TTL: the vertex budget of the TTL, or more
+        to trace the flows of the hop pairs on its both sides.
+        With `links_by_ttl` (e.g. the links known from a previous trace),
+        the Diamond-Miner budget is used.
+        """
+        if links_by_ttl is not None:
+            return super().max_flow_by_ttl(links_by_ttl)
+        links_by_ttl = self.budget_links_by_ttl()
+        vertices_by_ttl = get_vertices_by_ttl(self.link_index.links)
+        missing_flows = self.test_meshing(links_by_ttl, vertices_by_ttl)
+        budgets = {
+            ttl: self.pair_budget(ttl, links, vertices_by_ttl, missing_flows)
+            for ttl, links in links_by_ttl.items()
+        }
+        ttls = set(budgets) | {ttl + 1 for ttl in budgets if ttl < self.max_ttl}
+        ttls |= set(vertices_by_ttl)
+        # The vertices behind a per-packet load balancer are not stable, their
+        # budgets are not increased anymore.
+        ttls -= self.per_packet_ttls
+        return {
+            ttl: max(
+                self.vertex_budget(len(vertices_by_ttl.get(ttl, ()))),
+                budgets.get(ttl - 1, 0),
+                budgets.get(ttl, 0),
+            )
+            for ttl in ttls
+        }
+
+
+def get_vertices_by_ttl(links: Iterable[Link]) -> Dict[int, Set[str]]:
+    """
+    Addresses at each TTL, given the links between consecutive TTLs.
+    >>> vertices_by_ttl = get_vertices_by_ttl({(1, "a", "b"), (1, "a", "c"), (2, "c", None)})
+    >>> sorted((ttl, sorted(addrs)) for ttl, addrs in vertices_by_ttl.items())
+    [(1, ['a']), (2, ['b', 'c'])]
+    """
+    vertices_by_ttl: Dict[int, Set[str]] = defaultdict(set)
+    for near_ttl, near_addr, far_addr in links:
+        if near_addr:
+            vertices_by_ttl[near_ttl].add(near_addr)
+        if far_addr:
+            vertices_by_ttl[near_ttl + 1].add(far_addr)
+    return vertices_by_ttl
+
+
+def get_traced_flows(
+    links_by_flow: Iterable[Set[Link]], ttls: Set[int]
+) -> Tuple[Counter, Counter]:
+    """
+    Number of flows traced from each address at `ttls` to the next TTL,
+    and to each address at the next TTL from `ttls`, by (near TTL, address).
+    """
+    out_flows: Counter[Tuple[int, str]] = Counter()
+    in_flows: Counter[Tuple[int, str]] = Counter()
+    for links in links_by_flow:
+        for near_ttl, near_addr, far_addr in links:
+            if near_ttl in ttls and near_addr and far_addr:
+                out_flows[near_ttl, near_addr] += 1
+                in_flows[near_ttl, far_addr] += 1
+    return out_flows, in_flows
+
+
+def is_meshed(links: Set[Link]) -> bool:
+    """
+    A hop pair is meshed if a vertex has multiple successors
+    and a vertex has multiple predecessors.
+    >>> is_meshed({(1, "a", "c"), (1, "a", "d"), (1, "b", "d")})
+    True
+    >>> is_meshed({(1, "a", "c"), (1, "a", "d"), (1, "b", "e")})
+    False
+    """
+    links = {link for link in links if link[1] and link[2]}
+    out_degrees = Counter(near_addr for _, near_addr, _ in links)
+    in_degrees = Counter(far_addr for _, _, far_addr in links)
+    max_out_degree = max(out_degrees.values(), default=0)
+    max_in_degree = max(in_degrees.values(), default=0)
+    return max_out_degree > 1 and max_in_degree > 1
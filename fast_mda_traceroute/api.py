@@ -0,0 +1,195 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Type
+
+from pycaracal import Probe, Reply, experimental, utilities
+
+from fast_mda_traceroute.algorithms import DiamondMiner
+from fast_mda_traceroute.replies import ReplyStore
+from fast_mda_traceroute.typing import Link
+from fast_mda_traceroute.utils import interleave
+
+
+class TraceResult(NamedTuple):
+    """The result of a trace towards `dst_addr`."""
+
+    dst_addr: str
+    start_time: datetime
+    stop_time: datetime
+    rounds: int
+    probes: int
+    replies: ReplyStore
+    links: Set[Link]
+    destination_ttl: Optional[int]
+    per_packet_ttls: Set[int]
+    rate_limited_ttls: Set[int]
+
+    @classmethod
+    def from_algorithm(
+        cls, alg: DiamondMiner, start_time: datetime, stop_time: datetime
+    ) -> "TraceResult":
+        return cls(
+            alg.dst_addr,
+            start_time,
+            stop_time,
+            # The last round of the algorithm has no probes.
+            max(alg.current_round - 1, 0),
+            sum(alg.probes_sent.values()) + sum(alg.probes_resent.values()),
+            alg.replies,
+            set(alg.links),
+            alg.destination_ttl,
+            set(alg.per_packet_ttls),
+            set(alg.rate_limited_ttls),
+        )
+
+
+class Tracer:
+    """
+    Shares a prober between concurrent traces.
+    The probes submitted by the traces while the prober is busy are merged in a
+    single call, as in `runner.run`, and the replies are dispatched back by probe
+    destination. The prober is blocking, so it runs in a dedicated thread, off the
+    event loop. `prober` is a `pycaracal.experimental.Prober`, or any object with the
+    same `probe(probes, wait)` method (e.g. `simulator.SimulatedProber`).
+    The concurrent traces must be towards different destinations.
+    """
+
+    def __init__(self, prober) -> None:
+        self.prober = prober
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # Created in the running event loop, cf. `get_lock`.
+        self.lock: Optional[asyncio.Lock] = None
+        self.lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pending: List[Tuple[List[Probe], int, asyncio.Future[List[Reply]]]] = []
+        # Keep a reference to the running tasks, the event loop only keeps weak ones.
+        self.tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_interface(
+        cls,
+        interface: Optional[str] = None,
+        probing_rate: int = 100,
+        buffer_size: int = 1024 * 1024,
+        instance_id: int = 0,
+        integrity_check: bool = True,
+    ) -> "Tracer":
+        """A tracer with a new pycaracal prober (this requires raw sockets)."""
+        prober = experimental.Prober(
+            interface or utilities.get_default_interface(),
+            probing_rate,
+            buffer_size,
+            instance_id,
+            integrity_check,
+        )
+        return cls(prober)
+
+    async def probe(self, probes: List[Probe], wait: int) -> List[Reply]:
+        """Send the probes, and return their replies received within `wait` ms."""
+        future: asyncio.Future[List[Reply]] = asyncio.get_running_loop().create_future()
+        self.pending.append((probes, wait, future))
+        task = asyncio.create_task(self.flush())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return await future
+
+    def get_lock(self) -> asyncio.Lock:
+        """
+        The lock of the running event loop. Before Python 3.10, an `asyncio.Lock`
+        is bound to the current event loop when it is created, so it cannot be
+        created in `__init__`, outside of the loop (e.g. before `asyncio.run`).
+        """
+        loop = asyncio.get_running_loop()
+        if self.lock is None or self.lock_loop is not loop:
+            self.lock = asyncio.Lock()
+            self.lock_loop = loop
+        return self.lock
+
+    async def flush(self) -> None:
+        async with self.get_lock():
+            batch = [x for x in self.pending if not x[2].done()]
+            self.pending = []
+            if not batch:
+                return
+            owners: Dict[str, asyncio.Future[List[Reply]]] = {}
+            for probes, _, future in batch:
+                for probe in probes:
+                    owners[probe.dst_addr] = future
+            probes = interleave([x[0] for x in batch])
+            wait = max(x[1] for x in batch)
+            loop = asyncio.get_running_loop()
+            try:
+                replies = await loop.run_in_executor(
+                    self.executor, self.prober.probe, probes, wait
+                )
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            replies_by_future: Dict[asyncio.Future[List[Reply]], List[Reply]] = {
+                future: [] for _, _, future in batch
+            }
+            for reply in replies:
+                if reply.probe_dst_addr in owners:
+                    replies_by_future[owners[reply.probe_dst_addr]].append(reply)
+            for future, future_replies in replies_by_future.items():
+                # The trace may have been cancelled in the meantime.
+                if not future.done():
+                    future.set_result(future_replies)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+async def trace(
+    dst_addr: str,
+    tracer: Tracer,
+    min_ttl: int = 1,
+    max_ttl: int = 32,
+    src_port: int = 24000,
+    dst_port: int = 33434,
+    protocol: str = "icmp",
+    confidence: int = 95,
+    max_round: int = 10,
+    wait: int = 1000,
+    adaptive_wait: bool = False,
+    timeout: Optional[float] = None,
+    algorithm: Type[DiamondMiner] = DiamondMiner,
+    **kwargs,
+) -> TraceResult:
+    """
+    Trace the paths towards `dst_addr` (an IP address) with `algorithm`, and return
+    the result. The traces that share the same `tracer` can run concurrently, e.g.
+    with `asyncio.gather`, and a trace can be cancelled at any time.
+    `timeout` is in seconds (`asyncio.TimeoutError` is raised when it expires), the
+    other parameters are the same as the options of the command line interface.
+    Additional keyword arguments are passed to the algorithm, e.g. `retries`.
+
+    >>> tracer = Tracer.from_interface()  # doctest: +SKIP
+    >>> asyncio.run(trace("8.8.8.8", tracer)).links  # doctest: +SKIP
+    """
+    alg = algorithm(
+        dst_addr,
+        min_ttl,
+        max_ttl,
+        src_port,
+        dst_port,
+        protocol,
+        confidence,
+        max_round,
+        **kwargs,
+    )
+    start_time = datetime.now()
+
+    async def rounds() -> None:
+        probes = alg.next_round([])
+        while probes:
+            round_wait = alg.adaptive_wait(wait) if adaptive_wait else wait
+            replies = await tracer.probe(probes, round_wait)
+            probes = alg.next_round(replies)
+            if alg.checkpoint:
+                alg.checkpoint.flush()
+
+    await asyncio.wait_for(rounds(), timeout)
+    return TraceResult.from_algorithm(alg, start_time, datetime.now())
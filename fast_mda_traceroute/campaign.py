@@ -0,0 +1,189 @@
+import multiprocessing
+import queue
+import sys
+from typing import Callable, List, NamedTuple, Optional, Sequence, Set, TextIO, Type
+
+from pycaracal import experimental
+
+from fast_mda_traceroute.algorithms import DiamondMiner
+from fast_mda_traceroute.formats import JSONStreamWriter
+from fast_mda_traceroute.runner import run
+
+# Interval in seconds at which the liveness of the workers is checked.
+POLL_INTERVAL = 1.0
+
+ProberFactory = Callable[[str, int, int], object]
+"""Create a prober from an interface, a probing rate, and an instance ID."""
+
+
+def make_caracal_prober(interface: str, probing_rate: int, instance_id: int):
+    return experimental.Prober(interface, probing_rate, 1024 * 1024, instance_id, True)
+
+
+class Worker(NamedTuple):
+    """The share of a campaign run by a worker process."""
+
+    interface: str
+    instance_id: int
+    probing_rate: int
+    dst_addrs: List[str]
+
+
+def plan_workers(
+    dst_addrs: Sequence[str],
+    interfaces: Sequence[str],
+    probing_rate: int,
+    workers_per_interface: int = 1,
+    instance_id: int = 0,
+) -> List[Worker]:
+    """
+    Shard the destinations over `workers_per_interface` workers per interface,
+    and split the global probing rate evenly between them (with fewer workers
+    if the probing rate is lower than the number of workers).
+    Each worker has its own instance ID, so that it ignores the replies
+    to the probes of the other workers on the same interface.
+
+    >>> for worker in plan_workers(["::1", "::2", "::3"], ["eth0", "eth1"], 1000):
+    ...     print(worker)
+    Worker(interface='eth0', instance_id=0, probing_rate=500, dst_addrs=['::1', '::3'])
+    Worker(interface='eth1', instance_id=1, probing_rate=500, dst_addrs=['::2'])
+    """
+    if probing_rate < 1:
+        raise ValueError("The probing rate must be positive.")
+    n_workers = min(
+        len(interfaces) * workers_per_interface, len(dst_addrs), probing_rate
+    )
+    return [
+        Worker(
+            interfaces[i % len(interfaces)],
+            (instance_id + i) % 65536,
+            probing_rate // n_workers,
+            list(dst_addrs[i::n_workers]),
+        )
+        for i in range(n_workers)
+    ]
+
+
+class QueueWriter:
+    """A text file that sends each record written to a queue, with its worker index."""
+
+    def __init__(self, records, index: int) -> None:
+        self.records = records
+        self.index = index
+
+    def write(self, s: str) -> None:
+        self.records.put((self.index, s))
+
+    def flush(self) -> None:
+        pass
+
+
+def run_worker(
+    index: int,
+    worker: Worker,
+    records,
+    make_prober: ProberFactory,
+    algorithm: Type[DiamondMiner],
+    alg_args: tuple,
+    alg_kwargs: dict,
+    wait: int,
+) -> None:
+    try:
+        prober = make_prober(worker.interface, worker.probing_rate, worker.instance_id)
+        algs = [
+            algorithm(dst_addr, *alg_args, **alg_kwargs)
+            for dst_addr in worker.dst_addrs
+        ]
+        writer = JSONStreamWriter(QueueWriter(records, index))  # type: ignore[arg-type]
+        run(prober, algs, worker.probing_rate, wait, on_round=writer)
+    finally:
+        # End of the output of this worker.
+        records.put((index, None))
+
+
+def run_campaign(
+    dst_addrs: Sequence[str],
+    interfaces: Sequence[str],
+    probing_rate: int,
+    output: TextIO = sys.stdout,
+    workers_per_interface: int = 1,
+    instance_id: int = 0,
+    min_ttl: int = 1,
+    max_ttl: int = 32,
+    src_port: int = 24000,
+    dst_port: int = 33434,
+    protocol: str = "icmp",
+    confidence: int = 95,
+    max_round: int = 10,
+    wait: int = 1000,
+    algorithm: Type[DiamondMiner] = DiamondMiner,
+    make_prober: Optional[ProberFactory] = None,
+    **kwargs,
+) -> None:
+    """
+    Trace the destinations with worker processes, each with its own prober and
+    algorithms, on the given interfaces (cf. `plan_workers`), within a global
+    `probing_rate` budget. The link computation and the formatting are done by the
+    workers, and their json-stream outputs are merged in `output`, one record per line.
+    `make_prober` creates the prober of each worker, in the worker process,
+    a pycaracal prober by default.
+    Additional keyword arguments are passed to the algorithms, e.g. `retries`.
+    """
+    workers = plan_workers(
+        dst_addrs, interfaces, probing_rate, workers_per_interface, instance_id
+    )
+    alg_args = (
+        min_ttl,
+        max_ttl,
+        src_port,
+        dst_port,
+        protocol,
+        confidence,
+        max_round,
+    )
+    records: multiprocessing.Queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(
+                index,
+                worker,
+                records,
+                make_prober or make_caracal_prober,
+                algorithm,
+                alg_args,
+                kwargs,
+                wait,
+            ),
+        )
+        for index, worker in enumerate(workers)
+    ]
+    for process in processes:
+        process.start()
+    done: Set[int] = set()
+    while len(done) < len(processes):
+        try:
+            index, record = records.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            # A worker killed by a signal (e.g. a crash or the OOM killer) does not
+            # send the end of its output, its records have all been received since.
+            done.update(
+                index
+                for index, process in enumerate(processes)
+                if process.exitcode is not None
+            )
+            continue
+        if record is None:
+            done.add(index)
+        else:
+            output.write(record)
+            output.flush()
+    for process in processes:
+        process.join()
+    failed = {
+        index: process.exitcode
+        for index, process in enumerate(processes)
+        if process.exitcode
+    }
+    if failed:
+        raise RuntimeError(f"Some workers failed (exit codes by worker: {failed}).")
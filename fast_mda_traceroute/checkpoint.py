@@ -0,0 +1,91 @@
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from pycaracal import Probe, Reply
+
+from fast_mda_traceroute.logger import logger
+from fast_mda_traceroute.replies import StoredReply
+
+
+def format_probe(probe: Probe) -> tuple:
+    return probe.dst_addr, probe.src_port, probe.dst_port, probe.ttl, probe.protocol
+
+
+def format_reply(reply: Reply) -> list:
+    return [getattr(reply, field) for field in StoredReply._fields]
+
+
+def parse_reply(values: list) -> StoredReply:
+    return StoredReply(*values)
+
+
+class Checkpoint:
+    """
+    Append-only, on-disk, log of the rounds of one or more traces.
+    Each line is a JSON record with the probes sent during a round
+    and the replies received for these probes:
+    `{"dst_addr": ..., "round": ..., "probes": [...], "replies": [...]}`.
+    The records are written once the replies of a round are received, so that a
+    trace can be resumed from its last completed round. A truncated last line,
+    e.g. after a crash, is ignored.
+    The records are buffered by `write`, and written with a single `fsync` by `flush`,
+    e.g. once per round of all the traces.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.records: Optional[Dict[str, List[dict]]] = None
+        self.pending: List[Tuple[str, int, List[Probe], List[Reply]]] = []
+
+    def read(self, dst_addr: str) -> List[dict]:
+        """The records of `dst_addr`, ordered by round."""
+        if self.records is None:
+            self.records = defaultdict(list)
+            if self.path.exists():
+                with self.path.open() as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            logger.warning("Ignoring invalid record in %s", self.path)
+                            continue
+                        record["probes"] = [tuple(x) for x in record["probes"]]
+                        record["replies"] = [parse_reply(x) for x in record["replies"]]
+                        self.records[record["dst_addr"]].append(record)
+        return sorted(self.records.get(dst_addr, []), key=lambda x: x["round"])
+
+    def write(
+        self,
+        dst_addr: str,
+        round_: int,
+        probes: List[Probe],
+        replies: List[Reply],
+    ) -> None:
+        self.pending.append((dst_addr, round_, probes, replies))
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        records = [
+            {
+                "dst_addr": dst_addr,
+                "round": round_,
+                "probes": [format_probe(x) for x in probes],
+                "replies": [format_reply(x) for x in replies],
+            }
+            for dst_addr, round_, probes, replies in self.pending
+        ]
+        self.pending = []
+        with self.path.open("a+b") as f:
+            if f.tell() > 0:
+                # Terminate a truncated last line, if any.
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            for record in records:
+                f.write(json.dumps(record).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
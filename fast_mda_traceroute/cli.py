@@ -3,25 +3,36 @@ import logging
 import socket
 import sys
 from datetime import datetime
+from pathlib import Path
 from random import randint
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import pycaracal
 import typer
-from pycaracal import Probe, Reply, experimental, utilities
+from more_itertools import unique_everseen
+from pycaracal import experimental, utilities
 
 from fast_mda_traceroute import __version__
-from fast_mda_traceroute.algorithms import DiamondMiner
+from fast_mda_traceroute.algorithms import DiamondMiner, MDALite
+from fast_mda_traceroute.checkpoint import Checkpoint
 from fast_mda_traceroute.commands import paris_traceroute_command, scamper_command
-from fast_mda_traceroute.dns import resolve
+from fast_mda_traceroute.dns import Resolver
 from fast_mda_traceroute.formats import (
+    JSONStreamWriter,
+    format_binary,
+    format_cycle_start,
+    format_cycle_stop,
     format_scamper_json,
     format_table,
     format_traceroute,
 )
 from fast_mda_traceroute.logger import logger
+from fast_mda_traceroute.prior import load_prior_links
+from fast_mda_traceroute.replies import Replies
+from fast_mda_traceroute.runner import run
 from fast_mda_traceroute.typing import (
     AddressFamily,
+    Algorithm,
     DestinationType,
     EquivalentCommand,
     LogLevel,
@@ -32,6 +43,11 @@ from fast_mda_traceroute.utils import is_ipv4
 
 app = typer.Typer()
 
+algorithm_classes = {
+    Algorithm.DiamondMiner: DiamondMiner,
+    Algorithm.MDALite: MDALite,
+}
+
 eq_command_fns = {
     EquivalentCommand.ParisTraceroute: paris_traceroute_command,
     EquivalentCommand.Scamper: scamper_command,
@@ -44,6 +60,27 @@ def version_callback(value: bool):
         raise typer.Exit()
 
 
+def traces(
+    algs: List[DiamondMiner], prefix: bool
+) -> Iterator[Tuple[DiamondMiner, str, Dict[int, int], Replies]]:
+    """
+    The probes sent and the ICMP time exceeded replies, for each destination.
+    In prefix mode, each probed address of the prefixes is a destination.
+    """
+    for alg in algs:
+        if not prefix:
+            yield alg, alg.dst_addr, alg.probes_sent, alg.time_exceeded_replies
+            continue
+        replies_by_dst = alg.time_exceeded_replies_by_dst()
+        for dst_addr, probes_sent in alg.probes_sent_by_dst().items():
+            if not any(probes_sent.values()):
+                continue
+            replies = replies_by_dst.get(dst_addr, [])
+            if not replies:
+                logger.info("dst_addr=%s message=no replies", dst_addr)
+            yield alg, dst_addr, probes_sent, replies
+
+
 @app.command()
 def main(
     af: AddressFamily = typer.Option(
@@ -63,14 +100,18 @@ def main(
         Protocol.ICMP.value,
         help="Protocol to use for the probe packets.",
     ),
-    _destination_type: DestinationType = typer.Option(
+    destination_type: DestinationType = typer.Option(
         DestinationType.Address.value,
         help="Whether to probe a single address, or the whole /24 or /64.",
-    ),  # TODO: Implement.
+    ),
     format: OutputFormat = typer.Option(
         OutputFormat.Table.value,
         help="Output format.",
     ),
+    algorithm: Algorithm = typer.Option(
+        Algorithm.DiamondMiner.value,
+        help="Multipath detection algorithm.",
+    ),
     confidence: int = typer.Option(
         95,
         min=0,
@@ -84,11 +125,21 @@ def main(
         metavar="ROUNDS",
         help="Maximum number of Diamond-Miner rounds.",
     ),
+    retries: int = typer.Option(
+        0,
+        min=0,
+        metavar="RETRIES",
+        help="Maximum number of times an unanswered probe is sent again, at the TTLs that replied to other probes.",
+    ),
     wait: int = typer.Option(
         1000,
         min=0,
         metavar="MILLISECONDS",
-        help="Time in milliseconds to wait for a reply.",
+        help="Time in milliseconds to wait for a reply (upper bound with --adaptive-wait).",
+    ),
+    adaptive_wait: bool = typer.Option(
+        False,
+        help="Derive the time to wait after each round from the RTTs observed in the previous rounds.",
     ),
     min_ttl: int = typer.Option(
         1,
@@ -104,6 +155,13 @@ def main(
         metavar="TTL",
         help="Maximum TTL to probe.",
     ),
+    initial_max_ttl: int = typer.Option(
+        16,
+        min=0,
+        max=255,
+        metavar="TTL",
+        help="Maximum TTL to probe in the first round (at least --min-ttl). The TTL range is then extended up to --max-ttl until the destination replies.",
+    ),
     src_port: int = typer.Option(
         24000,
         min=0,
@@ -118,6 +176,20 @@ def main(
         metavar="PORT",
         help="UDP destination port. Not used for ICMP probes.",
     ),
+    src_port_count: Optional[int] = typer.Option(
+        None,
+        min=1,
+        max=65536,
+        metavar="PORTS",
+        help="Number of source ports (or ICMP checksum values) used for the flow IDs, starting at --src-port (all the ports above by default).",
+    ),
+    dst_port_count: int = typer.Option(
+        1,
+        min=1,
+        max=65536,
+        metavar="PORTS",
+        help="Number of UDP destination ports used for the flow IDs, starting at --dst-port, once the source ports are exhausted.",
+    ),
     instance_id: int = typer.Option(
         randint(0, 65535),
         min=0,
@@ -150,7 +222,37 @@ def main(
         callback=version_callback,
         help="Print program version.",
     ),
-    destination: str = typer.Argument(..., help="Destination hostname or IP address."),
+    checkpoint: Optional[Path] = typer.Option(
+        None,
+        metavar="FILE",
+        help="File in which the rounds are recorded. If it already exists, the traces are resumed from their last recorded round.",
+    ),
+    warm_start: Optional[Path] = typer.Option(
+        None,
+        metavar="FILE",
+        exists=True,
+        dir_okay=False,
+        help="Output (scamper-json) or checkpoint of a previous run. The flow budget of the known links is sent in the first round.",
+    ),
+    dns_cache: Optional[Path] = typer.Option(
+        None,
+        metavar="FILE",
+        dir_okay=False,
+        help="File in which the resolved addresses are cached (for one hour).",
+    ),
+    metrics: Optional[typer.FileTextWrite] = typer.Option(
+        None,
+        metavar="FILE",
+        help="File in which to write the metrics of each round (time spent in each phase, replies, convergence), as JSON lines.",
+    ),
+    targets: Optional[typer.FileText] = typer.Option(
+        None,
+        metavar="FILE",
+        help="File containing one destination per line (- for stdin), traced concurrently.",
+    ),
+    destination: Optional[str] = typer.Argument(
+        None, help="Destination hostname or IP address."
+    ),
 ):
     # Configure Python logger
     logging.basicConfig(
@@ -164,19 +266,39 @@ def main(
     pycaracal.set_log_level(logging.getLevelName(log_level.value))
     pycaracal.set_log_format("[%Y-%m-%d %H:%M:%S,%e] %v")
 
-    dst_addr = resolve(destination, af)[0]
-    hostname = socket.gethostname()
+    if (destination is None) == (targets is None):
+        raise typer.BadParameter("Specify either a destination or --targets.")
 
-    if is_ipv4(dst_addr):
-        src_addr = utilities.source_ipv4_for(interface)
+    if destination:
+        hosts = [destination]
     else:
-        src_addr = utilities.source_ipv6_for(interface)
+        hosts = [line.strip() for line in targets]  # type: ignore
+        hosts = [host for host in hosts if host and not host.startswith("#")]
+
+    dst_addrs = []
+    resolved = Resolver(dns_cache).resolve_all(hosts, af)
+    for host in hosts:
+        addrs = resolved[host]
+        if isinstance(addrs, socket.gaierror):
+            if not targets:
+                raise addrs
+            logger.warning("Cannot resolve %s: %s", host, addrs)
+            continue
+        dst_addrs.append(addrs[0])
+    dst_addrs = list(unique_everseen(dst_addrs))
+    if not dst_addrs:
+        raise typer.BadParameter("No destination to trace.")
+
+    hostname = socket.gethostname()
+    src_addrs: Dict[bool, str] = {}
+    if any(is_ipv4(x) for x in dst_addrs):
+        src_addrs[True] = utilities.source_ipv4_for(interface)
+    if not all(is_ipv4(x) for x in dst_addrs):
+        src_addrs[False] = utilities.source_ipv6_for(interface)
 
     logger.info(
-        "hostname=%s src_addr=%s dst_addr=%s interface=%s probing_rate=%d buffer_size=%d instance_id=%d integrity_check=%s version=%s",
+        "hostname=%s interface=%s probing_rate=%d buffer_size=%d instance_id=%d integrity_check=%s version=%s",
         hostname,
-        src_addr,
-        dst_addr,
         interface,
         probing_rate,
         buffer_size,
@@ -184,72 +306,113 @@ def main(
         integrity_check,
         __version__,
     )
+    for dst_addr in dst_addrs:
+        logger.info("src_addr=%s dst_addr=%s", src_addrs[is_ipv4(dst_addr)], dst_addr)
 
     if print_command:
         eq_command_fn = eq_command_fns[print_command]
-        eq_command = eq_command_fn(
-            dst_addr,
-            probing_rate,
-            protocol,
-            min_ttl,
-            max_ttl,
-            src_port,
-            dst_port,
-            wait,
-        )
-        print(eq_command)
+        for dst_addr in dst_addrs:
+            eq_command = eq_command_fn(
+                dst_addr,
+                probing_rate,
+                protocol,
+                min_ttl,
+                max_ttl,
+                src_port,
+                dst_port,
+                wait,
+            )
+            print(eq_command)
         raise typer.Exit()
 
+    algorithm_class = algorithm_classes[algorithm]
+    prefix = destination_type == DestinationType.Prefix
+    prefix_lens = {True: 24, False: 64}
+    checkpoint_ = Checkpoint(checkpoint) if checkpoint else None
+    prior_links = load_prior_links(warm_start) if warm_start else {}
+    try:
+        algs = [
+            algorithm_class(
+                dst_addr,
+                min_ttl,
+                max_ttl,
+                src_port,
+                dst_port,
+                protocol.value,
+                confidence,
+                max_round,
+                initial_max_ttl=initial_max_ttl,
+                checkpoint=checkpoint_,
+                prior_links_by_ttl=prior_links.get(dst_addr),
+                src_port_count=src_port_count,
+                dst_port_count=dst_port_count,
+                prefix_len=prefix_lens[is_ipv4(dst_addr)] if prefix else None,
+                retries=retries,
+            )
+            for dst_addr in dst_addrs
+        ]
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    if prefix:
+        # The addresses of a same prefix are traced together.
+        algs = list(unique_everseen(algs, key=lambda x: x.dst_addr))
+
     prober = experimental.Prober(
         interface, probing_rate, buffer_size, instance_id, integrity_check
     )
-    alg = DiamondMiner(
-        dst_addr,
-        min_ttl,
-        max_ttl,
-        src_port,
-        dst_port,
-        protocol.value,
-        confidence,
-        max_round,
-    )
+    on_round = JSONStreamWriter() if format == OutputFormat.JSONStream else None
+
+    def write_metrics(obj: dict) -> None:
+        print(json.dumps(obj), file=metrics, flush=True)
 
     start_time = datetime.now()
-    last_replies: List[Reply] = []
-    while True:
-        probes = [Probe(*x) for x in alg.next_round(last_replies)]
-        logger.info(
-            "round=%d links_found=%d probes=%d expected_time=%.1fs",
-            alg.current_round,
-            len(alg.links),
-            len(probes),
-            len(probes) / probing_rate,
-        )
-        if not probes:
-            break
-        last_replies = prober.probe(probes, wait)
+    run(
+        prober,
+        algs,
+        probing_rate,
+        wait,
+        adaptive_wait,
+        on_round,
+        write_metrics if metrics else None,
+    )
     stop_time = datetime.now()
 
-    if format == OutputFormat.ScamperJSON:
-        objs = format_scamper_json(
-            confidence,
-            probing_rate,
-            hostname,
-            src_addr,
-            dst_addr,
-            protocol,
-            min_ttl,
-            src_port,
-            dst_port,
-            wait,
-            start_time,
-            stop_time,
-            alg.probes_sent,
-            alg.time_exceeded_replies,
-        )
+    if format == OutputFormat.JSONStream:
+        # Already written while tracing.
+        pass
+    elif format == OutputFormat.Binary:
+        for alg in algs:
+            sys.stdout.buffer.write(format_binary(alg.dst_addr, alg.replies, alg.links))
+        sys.stdout.buffer.flush()
+    elif format == OutputFormat.ScamperJSON:
+        objs = [format_cycle_start(hostname, start_time)]
+        for alg, dst_addr, probes_sent, replies in traces(algs, prefix):
+            _, tracelb, _ = format_scamper_json(
+                confidence,
+                probing_rate,
+                hostname,
+                src_addrs[is_ipv4(alg.dst_addr)],
+                dst_addr,
+                protocol,
+                min_ttl,
+                src_port,
+                dst_port,
+                wait,
+                start_time,
+                stop_time,
+                probes_sent,
+                replies,
+                alg.links,
+            )
+            objs.append(tracelb)
+        objs.append(format_cycle_stop(hostname, stop_time))
         for obj in objs:
             print(json.dumps(obj))
-    elif format == OutputFormat.Table:
-        print(format_table(alg.time_exceeded_replies))
     else:
-        print(format_traceroute(alg.time_exceeded_replies))
+        for alg, dst_addr, _, replies in traces(algs, prefix):
+            if len(algs) > 1 or prefix:
+                print(dst_addr)
+            if format == OutputFormat.Table:
+                print(format_table(replies))
+            else:
+                print(format_traceroute(replies))
@@ -1,11 +1,112 @@
-from socket import AF_INET, AF_INET6, getaddrinfo
-from typing import List
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import ip_address
+from pathlib import Path
+from socket import AF_INET, AF_INET6, gaierror, getaddrinfo
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
+from fast_mda_traceroute.logger import logger
 from fast_mda_traceroute.typing import AddressFamily
 
 AF = {AddressFamily.Any: 0, AddressFamily.IPv4: AF_INET, AddressFamily.IPv6: AF_INET6}
+VERSIONS = {
+    AddressFamily.Any: (4, 6),
+    AddressFamily.IPv4: (4,),
+    AddressFamily.IPv6: (6,),
+}
+
+
+def sort_addrs(addrs) -> List[str]:
+    """
+    Deduplicate and sort the addresses, IPv4 first, so that the address chosen
+    for a host does not depend on the order of the DNS answers.
+
+    >>> sort_addrs(["2001:db8::1", "192.0.2.2", "192.0.2.1", "192.0.2.2"])
+    ['192.0.2.1', '192.0.2.2', '2001:db8::1']
+    """
+    parsed = {ip_address(addr) for addr in addrs}
+    return [str(x) for x in sorted(parsed, key=lambda x: (x.version, x))]
 
 
 def resolve(host: str, af: AddressFamily) -> List[str]:
+    """The addresses of `host` in the address family `af`, sorted with `sort_addrs`."""
+    try:
+        addr = ip_address(host)
+    except ValueError:
+        pass
+    else:
+        # No need to go through the resolver for an address.
+        if addr.version in VERSIONS[af]:
+            return [str(addr)]
     info = getaddrinfo(host, None, AF[af])
-    return list(set(addr for _, _, _, _, (addr, *_) in info))
+    return sort_addrs(str(sockaddr[0]) for *_, sockaddr in info)
+
+
+class Resolver:
+    """
+    Resolves hosts concurrently, in `workers` threads, and caches the addresses
+    for `ttl` seconds, in memory, and in `path` (a JSON file) if given, so that
+    repeated runs over the same target list do not resolve the hosts again.
+    The failures are not cached.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        ttl: float = 3600,
+        workers: int = 32,
+    ):
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self.workers = workers
+        self.cache: Dict[str, Tuple[float, List[str]]] = {}
+        if self.path and self.path.exists():
+            try:
+                cache = json.loads(self.path.read_text())
+                self.cache = {key: (x[0], x[1]) for key, x in cache.items()}
+            except (AttributeError, LookupError, TypeError, ValueError):
+                logger.warning("Ignoring invalid DNS cache %s", self.path)
+
+    @staticmethod
+    def key(host: str, af: AddressFamily) -> str:
+        return f"{af.value}/{host}"
+
+    def cached(self, host: str, af: AddressFamily) -> Optional[List[str]]:
+        expiry, addrs = self.cache.get(self.key(host, af), (0, []))
+        return addrs if expiry > time.time() else None
+
+    def resolve(self, host: str, af: AddressFamily) -> List[str]:
+        """Same as `dns.resolve`, through the cache."""
+        addrs = self.cached(host, af)
+        if addrs is None:
+            addrs = resolve(host, af)
+            self.cache[self.key(host, af)] = (time.time() + self.ttl, addrs)
+        return addrs
+
+    def resolve_all(
+        self, hosts: Sequence[str], af: AddressFamily
+    ) -> Dict[str, Union[List[str], gaierror]]:
+        """
+        Resolve the hosts concurrently, and save the cache.
+        The hosts that cannot be resolved are mapped to their error.
+        """
+
+        def resolve_host(host: str) -> Union[List[str], gaierror]:
+            try:
+                return self.resolve(host, af)
+            except gaierror as e:
+                return e
+
+        hosts = list(dict.fromkeys(hosts))
+        with ThreadPoolExecutor(self.workers) as executor:
+            results = dict(zip(hosts, executor.map(resolve_host, hosts)))
+        self.save()
+        return results
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        now = time.time()
+        cache = {key: value for key, value in self.cache.items() if value[0] > now}
+        self.path.write_text(json.dumps(cache))
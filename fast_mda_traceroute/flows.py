@@ -0,0 +1,49 @@
+from typing import Tuple
+
+
+class MultiFlowMapper:
+    """
+    Maps flow IDs over several dimensions: the addresses of the prefix first,
+    then the source ports, and then the destination ports (for UDP probes).
+    With the default parameters, this is the same as `SequentialFlowMapper(prefix_size=1)`.
+    The mapping is arithmetic in both directions, so a reply is attributed to its
+    flow ID in constant time with `flow_id`.
+
+    >>> mapper = MultiFlowMapper(prefix_size=2, src_port_count=3, dst_port_count=2)
+    >>> mapper.size
+    12
+    >>> mapper.offsets(7)
+    (1, 0, 1)
+    >>> mapper.flow_id(1, 0, 1)
+    7
+    """
+
+    def __init__(
+        self, prefix_size: int = 1, src_port_count: int = 1, dst_port_count: int = 1
+    ):
+        if min(prefix_size, src_port_count, dst_port_count) < 1:
+            raise ValueError("The number of addresses and ports must be positive.")
+        self.prefix_size = prefix_size
+        self.src_port_count = src_port_count
+        self.dst_port_count = dst_port_count
+
+    @property
+    def size(self) -> int:
+        """Number of distinct flow IDs."""
+        return self.prefix_size * self.src_port_count * self.dst_port_count
+
+    def offsets(self, flow_id: int) -> Tuple[int, int, int]:
+        """Address, source port and destination port offsets of a flow ID."""
+        if not 0 <= flow_id < self.size:
+            raise ValueError(f"Flow ID {flow_id} is out of range.")
+        port_offset, addr_offset = divmod(flow_id, self.prefix_size)
+        dst_port_offset, src_port_offset = divmod(port_offset, self.src_port_count)
+        return addr_offset, src_port_offset, dst_port_offset
+
+    def flow_id(
+        self, addr_offset: int, src_port_offset: int, dst_port_offset: int = 0
+    ) -> int:
+        """Flow ID of the given address, source port and destination port offsets."""
+        return addr_offset + self.prefix_size * (
+            src_port_offset + self.src_port_count * dst_port_offset
+        )
@@ -1,5 +1,20 @@
-from fast_mda_traceroute.formats.scamper import format_scamper_json
+from fast_mda_traceroute.formats.binary import format_binary, load_binary
+from fast_mda_traceroute.formats.scamper import (
+    format_cycle_start,
+    format_cycle_stop,
+    format_scamper_json,
+)
+from fast_mda_traceroute.formats.stream import JSONStreamWriter
 from fast_mda_traceroute.formats.table import format_table
 from fast_mda_traceroute.formats.traceroute import format_traceroute
 
-__all__ = ("format_scamper_json", "format_table", "format_traceroute")
+__all__ = (
+    "JSONStreamWriter",
+    "format_binary",
+    "format_cycle_start",
+    "format_cycle_stop",
+    "format_scamper_json",
+    "format_table",
+    "format_traceroute",
+    "load_binary",
+)
@@ -0,0 +1,132 @@
+import mmap
+import struct
+import sys
+from array import array
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Set, Union
+
+from fast_mda_traceroute.replies import ReplyStore, pack_addr, unpack_addr
+from fast_mda_traceroute.typing import Link
+
+MAGIC = b"FMDT"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHH16sQQ")
+"""Magic, version, reserved, destination address, number of replies and of links."""
+
+LINK = struct.Struct("<BB16s16s")
+"""TTL, flags (1: near address known, 2: far address known), near and far addresses."""
+
+# Name and typecode of the reply columns, in file order.
+COLUMNS = {name: column.typecode for name, column in ReplyStore().columns.items()}
+
+
+def padding(size: int) -> bytes:
+    return b"\0" * (-size % 8)
+
+
+def format_binary(dst_addr: str, replies: ReplyStore, links: Iterable[Link]) -> bytes:
+    """
+    Compact binary output of a trace, with the replies in columnar form.
+    All the integers are little-endian, and the addresses are 128-bit integers
+    (IPv4 addresses are mapped in IPv6). A trace is made of:
+
+    - a 40 bytes header (`HEADER`);
+    - the reply columns, in the order of `COLUMNS`, each padded to 8 bytes:
+      replies × (8 bytes capture timestamp, 1 byte probe protocol, 2 bytes probe
+      source port, 2 bytes probe destination port, 1 byte probe TTL, 1 byte quoted
+      TTL, 1 byte reply protocol, 1 byte ICMP type, 1 byte ICMP code, 1 byte reply
+      TTL, 2 bytes reply IP ID, 4 bytes RTT in tenth of milliseconds), and the high
+      and low 64 bits of the probe destination and of the reply source addresses;
+    - the links, as 34 bytes records (`LINK`), padded to 8 bytes.
+
+    Multiple traces can be concatenated in the same file.
+    The MPLS labels are not included.
+    """
+    links = sorted(links, key=str)
+    chunks = [
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            0,
+            pack_addr(dst_addr).to_bytes(16, "big"),
+            len(replies),
+            len(links),
+        )
+    ]
+    for name, typecode in COLUMNS.items():
+        column = array(typecode, replies.columns[name])
+        if sys.byteorder != "little":
+            column.byteswap()
+        chunks.append(column.tobytes())
+        chunks.append(padding(len(chunks[-1])))
+    for ttl, near_addr, far_addr in links:
+        chunks.append(
+            LINK.pack(
+                ttl,
+                (near_addr is not None) | (far_addr is not None) << 1,
+                pack_addr(near_addr or "::").to_bytes(16, "big"),
+                pack_addr(far_addr or "::").to_bytes(16, "big"),
+            )
+        )
+    chunks.append(padding(len(links) * LINK.size))
+    return b"".join(chunks)
+
+
+class BinaryTrace(NamedTuple):
+    dst_addr: str
+    replies: ReplyStore
+    links_by_ttl: Dict[int, Set[Link]]
+
+
+def load_binary(path: Union[str, Path]) -> List[BinaryTrace]:
+    """
+    Load the traces of a file written with `format_binary`.
+    The file is memory-mapped, and on little-endian hosts the reply columns are
+    read in place, without copy.
+    """
+    with Path(path).open("rb") as f:
+        if not Path(path).stat().st_size:
+            return []
+        buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    traces = []
+    offset = 0
+    while offset < len(buffer):
+        magic, version, _, dst_addr, n_replies, n_links = HEADER.unpack_from(
+            buffer, offset
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a fast-mda-traceroute binary file")
+        offset += HEADER.size
+        columns: Dict[str, Sequence[int]] = {}
+        for name, typecode in COLUMNS.items():
+            end = offset + n_replies * array(typecode).itemsize
+            columns[name] = buffer[offset:end].cast(typecode)
+            if sys.byteorder != "little":
+                column = array(typecode, columns[name])
+                column.byteswap()
+                columns[name] = column
+            offset = end + len(padding(end - offset))
+        links_by_ttl: Dict[int, Set[Link]] = defaultdict(set)
+        for _ in range(n_links):
+            ttl, flags, near_addr, far_addr = LINK.unpack_from(buffer, offset)
+            links_by_ttl[ttl].add(
+                (
+                    ttl,
+                    unpack_addr(int.from_bytes(near_addr, "big"))
+                    if flags & 1
+                    else None,
+                    unpack_addr(int.from_bytes(far_addr, "big")) if flags & 2 else None,
+                )
+            )
+            offset += LINK.size
+        offset += len(padding(n_links * LINK.size))
+        traces.append(
+            BinaryTrace(
+                unpack_addr(int.from_bytes(dst_addr, "big")),
+                ReplyStore.from_columns(columns),
+                links_by_ttl,
+            )
+        )
+    return traces
@@ -1,11 +1,10 @@
 from collections import OrderedDict
 from datetime import datetime
-from typing import List
+from typing import Iterable, List, Optional
 
-from pycaracal import Reply
-
-from fast_mda_traceroute.links import get_scamper_links
-from fast_mda_traceroute.typing import Protocol
+from fast_mda_traceroute.links import get_per_packet_ttls, get_scamper_links
+from fast_mda_traceroute.replies import Replies
+from fast_mda_traceroute.typing import Link, Protocol
 
 METHOD = {Protocol.ICMP: "icmp-echo", Protocol.UDP: "udp-sport"}
 
@@ -35,6 +34,26 @@ def format_reply(reply, initial_flow_id) -> dict:
     )
 
 
+def format_cycle_start(hostname: str, start_time: datetime) -> dict:
+    return OrderedDict(
+        type="cycle-start",
+        list_name="default",
+        id=0,
+        hostname=hostname,
+        start_time=int(start_time.timestamp()),
+    )
+
+
+def format_cycle_stop(hostname: str, stop_time: datetime) -> dict:
+    return OrderedDict(
+        type="cycle-stop",
+        list_name="default",
+        id=0,
+        hostname=hostname,
+        stop_time=int(stop_time.timestamp()),
+    )
+
+
 def format_scamper_json(
     confidence: int,
     probing_rate: int,
@@ -49,10 +68,13 @@ def format_scamper_json(
     start_time: datetime,
     stop_time: datetime,
     probes_sent: dict,
-    replies: List[Reply],
+    replies: Replies,
+    links: Optional[Iterable[Link]] = None,
 ):
     """
     Scamper-like JSON output, with the fields in the same order.
+    `links` are the links found by the algorithm, those between replying addresses
+    that no flow was traced through (e.g. inferred by MDA-Lite) have no probes.
     """
     sc_nodes = []
     sc_link_count = 0
@@ -63,8 +85,16 @@ def format_scamper_json(
     if protocol == Protocol.ICMP:
         initial_flow_id = src_port
 
-    links = get_scamper_links(replies)
-    for near_addr, hops in links.items():
+    per_packet_ttls = get_per_packet_ttls(replies)
+    scamper_links = get_scamper_links(replies)
+    if links:
+        replied = {(x.probe_ttl, x.reply_src_addr) for x in replies}
+        for near_ttl, near_addr, far_addr in links:
+            if near_addr is None or (near_ttl, near_addr) not in replied:
+                continue
+            if (near_ttl + 1, far_addr) in replied:
+                scamper_links[near_addr][near_ttl + 1].setdefault(far_addr, [])
+    for near_addr, hops in scamper_links.items():
         n_links = 0
         sc_links: List[List[dict]] = []
         for hop, far_addrs in hops.items():
@@ -94,14 +124,6 @@ def format_scamper_json(
     # Minimum IPv4 + ICMP size, without the encoded TTL
     probe_size = 20 + 10
 
-    cycle_start = OrderedDict(
-        type="cycle-start",
-        list_name="default",
-        id=0,
-        hostname=hostname,
-        start_time=int(start_time.timestamp()),
-    )
-
     tracelb = OrderedDict(
         type="tracelb",
         version="0.1",  # Same as scamper
@@ -129,17 +151,15 @@ def format_scamper_json(
         probec_max=0,
         nodec=len(sc_nodes),
         linkc=sc_link_count,
+        # Not in scamper: the TTLs with per-packet load-balancing.
+        per_packet_ttls=sorted(per_packet_ttls),
     )
 
     if sc_nodes:
         tracelb["nodes"] = sc_nodes
 
-    cycle_stop = OrderedDict(
-        type="cycle-stop",
-        list_name="default",
-        id=0,
-        hostname=hostname,
-        stop_time=int(stop_time.timestamp()),
-    )
-
-    return [cycle_start, tracelb, cycle_stop]
+    return [
+        format_cycle_start(hostname, start_time),
+        tracelb,
+        format_cycle_stop(hostname, stop_time),
+    ]
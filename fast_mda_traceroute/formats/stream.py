@@ -0,0 +1,60 @@
+import json
+import sys
+from datetime import datetime
+from typing import List, TextIO
+
+from pycaracal import Probe
+
+from fast_mda_traceroute.algorithms import DiamondMiner
+
+# Compact separators, and no circular references check since the records are flat.
+encoder = json.JSONEncoder(separators=(",", ":"), check_circular=False)
+
+
+def format_round(alg: DiamondMiner, probes: List[Probe]) -> dict:
+    return dict(
+        type="round",
+        dst_addr=alg.dst_addr,
+        round=alg.current_round,
+        probes=len(probes),
+        links=sorted(alg.round_links, key=str),
+        removed_links=sorted(alg.round_removed_links, key=str),
+    )
+
+
+def format_summary(alg: DiamondMiner, start_time: datetime) -> dict:
+    return dict(
+        type="summary",
+        dst_addr=alg.dst_addr,
+        start_time=start_time.timestamp(),
+        stop_time=datetime.now().timestamp(),
+        rounds=alg.current_round,
+        probes=sum(alg.probes_sent.values()) + sum(alg.probes_resent.values()),
+        replies=len(alg.replies),
+        links=len(alg.links),
+        nodes=len({addr for link in alg.links for addr in link[1:] if addr}),
+        destination_ttl=alg.destination_ttl,
+        per_packet_ttls=sorted(alg.per_packet_ttls),
+        rate_limited_ttls=sorted(alg.rate_limited_ttls),
+    )
+
+
+class JSONStreamWriter:
+    """
+    JSON lines output, written while tracing: a `round` record with the links
+    added (and removed) by each round, and a `summary` record once a destination
+    has been traced. To be used as the `on_round` callback of `runner.run`.
+    """
+
+    def __init__(self, file: TextIO = sys.stdout):
+        self.file = file
+        self.start_time = datetime.now()
+
+    def write(self, record: dict) -> None:
+        self.file.write(encoder.encode(record) + "\n")
+        self.file.flush()
+
+    def __call__(self, alg: DiamondMiner, probes: List[Probe]) -> None:
+        self.write(format_round(alg, probes))
+        if not probes:
+            self.write(format_summary(alg, self.start_time))
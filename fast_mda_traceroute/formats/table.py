@@ -1,12 +1,17 @@
-from typing import List
-
-from pycaracal import Reply
 from tabulate import tabulate
 
+from fast_mda_traceroute.links import get_per_packet_ttls, unique_replies
+from fast_mda_traceroute.replies import Replies
+
 
-def format_table(replies: List[Reply]) -> str:
+def format_table(replies: Replies) -> str:
+    """
+    One row per reply, without the duplicate replies to the probes sent again.
+    The TTLs with per-packet load-balancing are flagged.
+    """
+    per_packet_ttls = get_per_packet_ttls(replies)
     table = []
-    for reply in sorted(replies, key=lambda x: x.probe_ttl):
+    for reply in sorted(unique_replies(replies), key=lambda x: x.probe_ttl):
         table.append(
             (
                 reply.probe_ttl,
@@ -16,6 +21,7 @@ def format_table(replies: List[Reply]) -> str:
                 reply.reply_src_addr,
                 f"{reply.rtt / 10}ms",
                 reply.reply_mpls_labels,
+                "yes" if reply.probe_ttl in per_packet_ttls else "",
             )
         )
     return tabulate(
@@ -28,5 +34,6 @@ def format_table(replies: List[Reply]) -> str:
             "Reply IP",
             "RTT",
             "MPLS label stack",
+            "Per-packet",
         ),
     )
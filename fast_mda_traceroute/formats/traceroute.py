@@ -1,10 +1,9 @@
-from typing import List
-
 from more_itertools import map_reduce
-from pycaracal import Reply
+
+from fast_mda_traceroute.replies import Replies
 
 
-def format_traceroute(replies: List[Reply]) -> str:
+def format_traceroute(replies: Replies) -> str:
     # TODO: Print min/max/std RTT?
     if not replies:
         return ""
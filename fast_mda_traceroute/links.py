@@ -1,13 +1,16 @@
-from collections import defaultdict
-from typing import Dict, List, Optional, Set
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
 
-from more_itertools import map_reduce
+from more_itertools import map_reduce, unique_everseen
 from pycaracal import Reply
 
+from fast_mda_traceroute.replies import Replies, ReplyStore, unpack_addr
 from fast_mda_traceroute.typing import Flow, Link, Pair
 
+T = TypeVar("T")
 
-def get_replies_by_flow(replies: List[Reply]) -> Dict[Flow, List[Reply]]:
+
+def get_replies_by_flow(replies: Replies) -> Dict[Flow, List[Reply]]:
     return map_reduce(
         replies,
         lambda x: (
@@ -19,11 +22,41 @@ def get_replies_by_flow(replies: List[Reply]) -> Dict[Flow, List[Reply]]:
     )
 
 
-def get_replies_by_ttl(replies: List[Reply]) -> Dict[int, List[Reply]]:
+def get_replies_by_ttl(replies: Replies) -> Dict[int, List[Reply]]:
     return map_reduce(replies, lambda x: x.probe_ttl)  # type: ignore
 
 
-def get_pairs_by_flow(replies: List[Reply]) -> Dict[Flow, List[Pair]]:
+def unique_replies(replies: Replies) -> List[Reply]:
+    """
+    The first reply from each address, for each flow and TTL: the probes sent again
+    (e.g. the retries) can be answered more than once.
+    """
+    return list(
+        unique_everseen(
+            replies,
+            key=lambda x: (
+                x.probe_protocol,
+                x.probe_dst_addr,
+                x.probe_src_port,
+                x.probe_dst_port,
+                x.probe_ttl,
+                x.reply_src_addr,
+            ),
+        )
+    )
+
+
+def get_per_packet_ttls(replies: Replies) -> Set[int]:
+    """The TTLs at which a flow got replies from different addresses."""
+    return {
+        ttl
+        for addrs_by_ttl in get_addrs_by_flow(replies).values()
+        for ttl, addrs in addrs_by_ttl.items()
+        if len(addrs) > 1
+    }
+
+
+def get_pairs_by_flow(replies: Replies) -> Dict[Flow, List[Pair]]:
     pairs_by_flow = defaultdict(list)
     replies_by_flow = get_replies_by_flow(replies)
     for flow, replies in replies_by_flow.items():
@@ -37,44 +70,146 @@ def get_pairs_by_flow(replies: List[Reply]) -> Dict[Flow, List[Pair]]:
     return pairs_by_flow
 
 
-def get_links_by_ttl(replies: List[Reply]) -> Dict[int, Set[Link]]:
-    links_by_ttl = defaultdict(set)
-    pairs_by_flow = get_pairs_by_flow(replies)
-    for flow, pairs in pairs_by_flow.items():
-        for near_ttl, near_reply, far_reply in pairs:
+def get_addrs_by_flow(replies: Iterable[Reply]) -> Dict[Flow, Dict[int, Set[str]]]:
+    """Distinct reply addresses at each TTL, for each flow."""
+    addrs_by_flow: Dict[Flow, Dict[int, Set[str]]] = defaultdict(
+        lambda: defaultdict(set)
+    )
+    for reply in replies:
+        flow = (
+            reply.probe_protocol,
+            reply.probe_dst_addr,
+            reply.probe_src_port,
+            reply.probe_dst_port,
+        )
+        addrs_by_flow[flow][reply.probe_ttl].add(reply.reply_src_addr)
+    return addrs_by_flow
+
+
+def iter_flow_links(
+    addrs_by_ttl: Dict[int, Set[T]]
+) -> Iterator[Tuple[int, Optional[T], Optional[T]]]:
+    """Links of a single flow, given the reply addresses at each TTL."""
+    for near_ttl in range(min(addrs_by_ttl), max(addrs_by_ttl)):
+        near_addrs: Iterable[Optional[T]] = addrs_by_ttl.get(near_ttl) or [None]
+        far_addrs: Iterable[Optional[T]] = addrs_by_ttl.get(near_ttl + 1) or [None]
+        for near_addr in near_addrs:
+            for far_addr in far_addrs:
+                yield near_ttl, near_addr, far_addr
+
+
+def get_flow_links(addrs_by_ttl: Dict[int, Set[str]]) -> Set[Link]:
+    links = iter_flow_links(addrs_by_ttl)
+    return set(links)
+
+
+def get_links_by_ttl(replies: Replies) -> Dict[int, Set[Link]]:
+    """
+    Links between consecutive TTLs. The replies are reduced to their distinct
+    addresses for each flow and TTL, so that duplicate replies (or per-packet
+    load-balancing) do not multiply the work.
+    """
+    links_by_ttl: Dict[int, Set[Link]] = defaultdict(set)
+    if isinstance(replies, ReplyStore):
+        # The links are built on the packed addresses, which are only converted
+        # to strings once per distinct link.
+        packed_links: Set[Tuple[int, Optional[int], Optional[int]]] = set()
+        for packed_addrs_by_ttl in replies.addrs_by_flow().values():
+            for packed_link in iter_flow_links(packed_addrs_by_ttl):
+                packed_links.add(packed_link)
+        for near_ttl, near_addr, far_addr in packed_links:
             links_by_ttl[near_ttl].add(
                 (
                     near_ttl,
-                    near_reply.reply_src_addr if near_reply else None,
-                    far_reply.reply_src_addr if far_reply else None,
+                    unpack_addr(near_addr) if near_addr is not None else None,
+                    unpack_addr(far_addr) if far_addr is not None else None,
                 )
             )
+        return links_by_ttl
+    for addrs_by_ttl in get_addrs_by_flow(replies).values():
+        for link in iter_flow_links(addrs_by_ttl):
+            links_by_ttl[link[0]].add(link)
     return links_by_ttl
 
 
 def get_scamper_links(
-    replies: List[Reply],
+    replies: Replies,
 ) -> Dict[str, Dict[int, Dict[Optional[str], List[Reply]]]]:
-    """Data structure used in Scamper's JSON format."""
+    """
+    Data structure used in Scamper's JSON format. With per-packet load-balancing,
+    a flow is linked from each of its addresses at a TTL to each of its addresses
+    at the next replying TTL.
+    """
     links: Dict[str, Dict[int, Dict[Optional[str], List[Reply]]]] = defaultdict(
         lambda: defaultdict(lambda: defaultdict(list))
     )
-    replies_by_flow = get_replies_by_flow(replies)
+    replies_by_flow = get_replies_by_flow(unique_replies(replies))
     for flow, flow_replies in replies_by_flow.items():
         replies_by_ttl = get_replies_by_ttl(flow_replies)
         for near_ttl in range(min(replies_by_ttl), max(replies_by_ttl)):
-            # TODO: Handle per-packet load-balancing.
-            far_ttl = near_ttl + 1
-            near_reply = replies_by_ttl.get(near_ttl, [None])[0]
-            far_reply = replies_by_ttl.get(far_ttl, [None])[0]
-            if not near_reply:
-                continue
-            while not far_reply and far_ttl <= max(replies_by_ttl):
-                links[near_reply.reply_src_addr][far_ttl][None].append(None)
-                far_ttl += 1
-                far_reply = replies_by_ttl.get(far_ttl, [None])[0]
-            if far_reply:
-                links[near_reply.reply_src_addr][far_ttl][
-                    far_reply.reply_src_addr
-                ].append(far_reply)
+            for near_reply in replies_by_ttl.get(near_ttl, []):
+                far_ttl = near_ttl + 1
+                while far_ttl not in replies_by_ttl:
+                    links[near_reply.reply_src_addr][far_ttl][None].append(None)
+                    far_ttl += 1
+                for far_reply in replies_by_ttl[far_ttl]:
+                    links[near_reply.reply_src_addr][far_ttl][
+                        far_reply.reply_src_addr
+                    ].append(far_reply)
     return links
+
+
+class LinkIndex:
+    """
+    Links between consecutive TTLs, updated incrementally as replies arrive.
+    Only the flows that received new replies are recomputed, and a reference count
+    is kept for each link since a link (e.g. to an unknown node) can be
+    invalidated by a later reply of the same flow.
+    The result is identical to `get_links_by_ttl` over all the replies added so far.
+    """
+
+    def __init__(self) -> None:
+        self.addrs_by_flow: Dict[Flow, Dict[int, Set[str]]] = defaultdict(
+            lambda: defaultdict(set)
+        )
+        self.links_by_flow: Dict[Flow, Set[Link]] = {}
+        self.links_by_ttl: Dict[int, Set[Link]] = {}
+        self.links: Set[Link] = set()
+        self.counts: Counter[Link] = Counter()
+
+    def add(self, replies: Iterable[Reply]) -> Tuple[Set[Link], Set[Link]]:
+        """Add replies to the index, and return the links added and removed."""
+        added: Set[Link] = set()
+        removed: Set[Link] = set()
+        updated_flows = set()
+        for reply in replies:
+            flow = (
+                reply.probe_protocol,
+                reply.probe_dst_addr,
+                reply.probe_src_port,
+                reply.probe_dst_port,
+            )
+            addrs = self.addrs_by_flow[flow][reply.probe_ttl]
+            if reply.reply_src_addr not in addrs:
+                addrs.add(reply.reply_src_addr)
+                updated_flows.add(flow)
+        for flow in updated_flows:
+            old_links = self.links_by_flow.get(flow, set())
+            new_links = get_flow_links(self.addrs_by_flow[flow])
+            for link in old_links - new_links:
+                self.counts[link] -= 1
+                if not self.counts[link]:
+                    del self.counts[link]
+                    removed.add(link)
+                    self.links.discard(link)
+                    self.links_by_ttl[link[0]].discard(link)
+                    if not self.links_by_ttl[link[0]]:
+                        del self.links_by_ttl[link[0]]
+            for link in new_links - old_links:
+                self.counts[link] += 1
+                if self.counts[link] == 1:
+                    added.add(link)
+                    self.links.add(link)
+                    self.links_by_ttl.setdefault(link[0], set()).add(link)
+            self.links_by_flow[flow] = new_links
+        return added - removed, removed - added
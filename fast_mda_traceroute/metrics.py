@@ -0,0 +1,44 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from pycaracal import Probe, Reply
+
+from fast_mda_traceroute.algorithms import DiamondMiner
+
+
+def get_reply_counts(probes: List[Probe], replies: List[Reply]) -> Tuple[int, int]:
+    """Number of duplicate replies, and of replies that do not match any probe."""
+    sent = {(x.dst_addr, x.src_port, x.dst_port, x.ttl) for x in probes}
+    counts = Counter(
+        (x.probe_dst_addr, x.probe_src_port, x.probe_dst_port, x.probe_ttl)
+        for x in replies
+    )
+    duplicates = sum(count - 1 for key, count in counts.items() if key in sent)
+    unmatched = sum(count for key, count in counts.items() if key not in sent)
+    return duplicates, unmatched
+
+
+def get_ttl_metrics(algs: Iterable[DiamondMiner]) -> Dict[int, Dict[str, int]]:
+    """
+    Convergence at each TTL, summed over the algorithms: links found, probes sent,
+    flow budget computed in the last round, number of destinations for which the
+    budget has been sent, and number of destinations with per-packet load balancing,
+    or rate limiting, at this TTL.
+    """
+    metrics: Dict[int, Dict[str, int]] = defaultdict(
+        lambda: dict(
+            links=0, probes=0, budget=0, converged=0, per_packet=0, rate_limited=0
+        )
+    )
+    for alg in algs:
+        for ttl, budget in alg.round_budgets.items():
+            probes = alg.probes_sent.get(ttl, 0)
+            metrics[ttl]["links"] += len(alg.links_by_ttl.get(ttl, ()))
+            metrics[ttl]["probes"] += probes
+            metrics[ttl]["budget"] += budget
+            metrics[ttl]["converged"] += probes >= budget
+        for ttl in alg.per_packet_ttls:
+            metrics[ttl]["per_packet"] += 1
+        for ttl in alg.rate_limited_ttls:
+            metrics[ttl]["rate_limited"] += 1
+    return dict(sorted(metrics.items()))
@@ -0,0 +1,62 @@
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Set, Union
+
+from fast_mda_traceroute.checkpoint import parse_reply
+from fast_mda_traceroute.links import get_links_by_ttl
+from fast_mda_traceroute.replies import StoredReply
+from fast_mda_traceroute.typing import Link
+
+
+def get_tracelb_links(tracelb: dict) -> Dict[int, Set[Link]]:
+    """
+    Links of a scamper `tracelb` object. The TTL of a link is derived from
+    the TTL of the probes to its far address, so a link across unresponsive hops
+    is attributed to the TTL just before its far address. The TTL of a link without
+    probes (e.g. inferred by MDA-Lite) is the TTL of its near address.
+    """
+    links_by_ttl: Dict[int, Set[Link]] = defaultdict(set)
+    addr_ttls: Dict[str, int] = {}
+    unprobed_links = []
+    for node in tracelb.get("nodes", []):
+        for hop in node["links"]:
+            for link in hop:
+                if "probes" not in link:
+                    unprobed_links.append((node["addr"], link["addr"]))
+                for probe in link.get("probes", []):
+                    near_ttl = probe["ttl"] - 1
+                    links_by_ttl[near_ttl].add((near_ttl, node["addr"], link["addr"]))
+                    addr_ttls.setdefault(node["addr"], near_ttl)
+                    addr_ttls.setdefault(link["addr"], probe["ttl"])
+    for near_addr, far_addr in unprobed_links:
+        if near_addr in addr_ttls:
+            near_ttl = addr_ttls[near_addr]
+            links_by_ttl[near_ttl].add((near_ttl, near_addr, far_addr))
+    return links_by_ttl
+
+
+def load_prior_links(path: Union[str, Path]) -> Dict[str, Dict[int, Set[Link]]]:
+    """
+    Links by TTL, for each destination, of a previous trace.
+    The file can be a scamper-json output, or a checkpoint.
+    """
+    links: Dict[str, Dict[int, Set[Link]]] = {}
+    replies_by_dst: Dict[str, List[StoredReply]] = defaultdict(list)
+    with Path(path).open() as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("type") == "tracelb":
+                links_by_ttl = links.setdefault(record["dst"], defaultdict(set))
+                for ttl, ttl_links in get_tracelb_links(record).items():
+                    links_by_ttl[ttl].update(ttl_links)
+            elif "replies" in record:
+                replies_by_dst[record["dst_addr"]].extend(
+                    parse_reply(x) for x in record["replies"]
+                )
+    for dst_addr, replies in replies_by_dst.items():
+        links[dst_addr] = get_links_by_ttl([x for x in replies if x.time_exceeded])
+    return links
@@ -0,0 +1,66 @@
+from random import shuffle
+from typing import AbstractSet, Dict, List, Sequence, Tuple
+
+from pycaracal import Probe
+
+from fast_mda_traceroute.flows import MultiFlowMapper
+from fast_mda_traceroute.replies import pack_addr, unpack_addr
+from fast_mda_traceroute.utils import interleave
+
+
+def schedule_flows(
+    flows_by_ttl: Dict[int, Sequence[int]], paced_ttls: AbstractSet[int] = frozenset()
+) -> List[Tuple[int, int]]:
+    """
+    The order in which to send the flow IDs of each TTL, as (TTL, flow ID) pairs:
+    shuffled, except the flows of the `paced_ttls`, which are evenly spaced.
+    """
+    flows = [
+        (ttl, flow_id)
+        for ttl, flow_ids in flows_by_ttl.items()
+        if ttl not in paced_ttls
+        for flow_id in flow_ids
+    ]
+    shuffle(flows)
+    paced_flows = [
+        [(ttl, flow_id) for flow_id in flows_by_ttl[ttl]]
+        for ttl in sorted(paced_ttls)
+        if flows_by_ttl.get(ttl)
+    ]
+    if paced_flows:
+        return interleave([flows, *paced_flows])
+    return flows
+
+
+def build_probes(
+    dst_addr: str,
+    protocol: str,
+    src_port: int,
+    dst_port: int,
+    flows: Sequence[Tuple[int, int]],
+    mapper: MultiFlowMapper,
+) -> List[Probe]:
+    """
+    Probes for the given (TTL, flow ID) pairs, in the same order (cf. `schedule_flows`).
+    The address and the ports of each flow ID are computed once for all the TTLs,
+    and the `pycaracal.Probe` objects are built directly, without intermediate tuples.
+    """
+    if not flows:
+        return []
+    min_flow = min(flow_id for _, flow_id in flows)
+    max_flow = max(flow_id for _, flow_id in flows) + 1
+    prefix = pack_addr(dst_addr)
+    addrs_and_ports = []
+    for flow_id in range(min_flow, max_flow):
+        addr_offset, src_port_offset, dst_port_offset = mapper.offsets(flow_id)
+        addrs_and_ports.append(
+            (
+                unpack_addr(prefix + addr_offset),
+                src_port + src_port_offset,
+                dst_port + dst_port_offset,
+            )
+        )
+    return [
+        Probe(*addrs_and_ports[flow_id - min_flow], ttl, protocol)
+        for ttl, flow_id in flows
+    ]
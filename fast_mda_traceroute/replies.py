@@ -0,0 +1,232 @@
+from array import array
+from functools import lru_cache
+from ipaddress import IPv4Address, IPv6Address, ip_address
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from pycaracal import Reply
+
+IPV4_MAPPED = 0xFFFF << 32
+LOW_MASK = 2**64 - 1
+
+PackedFlow = Tuple[int, int, int, int]
+"""A `Flow` with the destination address packed as an integer."""
+
+
+@lru_cache(maxsize=2**16)
+def pack_addr(addr: str) -> int:
+    """
+    IP address as a 128-bit integer, IPv4 addresses are mapped in IPv6.
+    >>> pack_addr("::ffff:8.8.8.8") == pack_addr("8.8.8.8") == 0xFFFF08080808
+    True
+    """
+    value = int(ip_address(addr))
+    if "." in addr:
+        value |= IPV4_MAPPED
+    return value
+
+
+@lru_cache(maxsize=2**16)
+def unpack_addr(value: int) -> str:
+    """
+    IP address from a 128-bit integer, using the same notation as pycaracal.
+    >>> unpack_addr(0xFFFF08080808)
+    '8.8.8.8'
+    >>> unpack_addr(1)
+    '::1'
+    """
+    if value >> 32 == 0xFFFF:
+        return str(IPv4Address(value & 0xFFFFFFFF))
+    return str(IPv6Address(value))
+
+
+class StoredReply(NamedTuple):
+    """A reply read from a `ReplyStore`, with the same attributes as `pycaracal.Reply`."""
+
+    capture_timestamp: int
+    probe_protocol: int
+    probe_dst_addr: str
+    probe_src_port: int
+    probe_dst_port: int
+    probe_ttl: int
+    quoted_ttl: int
+    reply_src_addr: str
+    reply_protocol: int
+    reply_icmp_type: int
+    reply_icmp_code: int
+    reply_ttl: int
+    reply_id: int
+    rtt: int
+    reply_mpls_labels: List
+
+    @property
+    def time_exceeded(self) -> bool:
+        return (self.reply_protocol, self.reply_icmp_type) in ((1, 11), (58, 3))
+
+    @property
+    def echo_reply(self) -> bool:
+        return (self.reply_protocol, self.reply_icmp_type) in ((1, 0), (58, 129))
+
+    @property
+    def destination_unreachable(self) -> bool:
+        return (self.reply_protocol, self.reply_icmp_type) in ((1, 3), (58, 1))
+
+
+# Typecode of the columns that are stored as-is.
+COLUMNS = {
+    "capture_timestamp": "Q",
+    "probe_protocol": "B",
+    "probe_src_port": "H",
+    "probe_dst_port": "H",
+    "probe_ttl": "B",
+    "quoted_ttl": "B",
+    "reply_protocol": "B",
+    "reply_icmp_type": "B",
+    "reply_icmp_code": "B",
+    "reply_ttl": "B",
+    "reply_id": "H",
+    "rtt": "I",
+}
+
+# Addresses are stored as two columns of 64-bit integers (high and low bits).
+ADDRESS_COLUMNS = ("probe_dst_addr", "reply_src_addr")
+
+
+class ReplyStore:
+    """
+    Compact, columnar, storage of replies.
+    Each field is stored in a typed array, and the addresses as 128-bit integers,
+    which takes about 50 bytes per reply instead of a `pycaracal.Reply` object.
+    The MPLS labels, which are rare, are stored separately by reply index.
+    Iterating over the store yields `StoredReply` tuples which can be used
+    in place of `pycaracal.Reply` objects.
+    """
+
+    def __init__(self, replies: Iterable[Reply] = ()) -> None:
+        # Typed arrays, or read-only memory views for the stores built with `from_columns`.
+        self.columns: Dict[str, Any] = {
+            name: array(typecode) for name, typecode in COLUMNS.items()
+        }
+        for name in ADDRESS_COLUMNS:
+            self.columns[f"{name}_hi"] = array("Q")
+            self.columns[f"{name}_lo"] = array("Q")
+        self.mpls_labels: Dict[int, List] = {}
+        self.extend(replies)
+
+    @classmethod
+    def from_columns(cls, columns: Mapping[str, Sequence[int]]) -> "ReplyStore":
+        """
+        A store over existing columns (e.g. memory views of a memory-mapped file),
+        with the same names and types as the columns of an empty store.
+        """
+        store = cls()
+        if columns.keys() != store.columns.keys():
+            raise ValueError(f"Expected the columns {list(store.columns)}")
+        store.columns = dict(columns)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.columns["probe_ttl"])
+
+    def __getitem__(self, index: int) -> StoredReply:
+        if index < 0:
+            index += len(self)
+        return StoredReply(**self.row(index))
+
+    def __iter__(self) -> Iterator[StoredReply]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def row(self, index: int) -> dict:
+        row = {name: self.columns[name][index] for name in COLUMNS}
+        for name in ADDRESS_COLUMNS:
+            hi = self.columns[f"{name}_hi"][index]
+            lo = self.columns[f"{name}_lo"][index]
+            row[name] = unpack_addr(hi << 64 | lo)
+        row["reply_mpls_labels"] = self.mpls_labels.get(index, [])
+        return row
+
+    def append(self, reply: Reply) -> None:
+        self.extend([reply])
+
+    def extend(self, replies: Iterable[Reply]) -> None:
+        appends = [(name, self.columns[name].append) for name in COLUMNS]
+        address_appends = [
+            (
+                name,
+                self.columns[f"{name}_hi"].append,
+                self.columns[f"{name}_lo"].append,
+            )
+            for name in ADDRESS_COLUMNS
+        ]
+        for reply in replies:
+            if reply.reply_mpls_labels:
+                self.mpls_labels[len(self)] = reply.reply_mpls_labels
+            for name, append in appends:
+                append(getattr(reply, name))
+            for name, append_hi, append_lo in address_appends:
+                value = pack_addr(getattr(reply, name))
+                append_hi(value >> 64)
+                append_lo(value & LOW_MASK)
+
+    def select(self, indices: Iterable[int]) -> "ReplyStore":
+        """A new store with the replies at the given indices."""
+        store = ReplyStore()
+        for index in indices:
+            if index in self.mpls_labels:
+                store.mpls_labels[len(store)] = self.mpls_labels[index]
+            for name, column in self.columns.items():
+                store.columns[name].append(column[index])
+        return store
+
+    def time_exceeded(self) -> "ReplyStore":
+        """A new store with the ICMP time exceeded replies only."""
+        return self.select(
+            index
+            for index, key in enumerate(
+                zip(self.columns["reply_protocol"], self.columns["reply_icmp_type"])
+            )
+            if key in ((1, 11), (58, 3))
+        )
+
+    def addrs_by_flow(self) -> Dict[PackedFlow, Dict[int, Set[int]]]:
+        """
+        Distinct reply addresses at each TTL, for each flow, as packed integers.
+        This is computed column-wise, without building the intermediate replies.
+        """
+        addrs_by_flow: Dict[PackedFlow, Dict[int, Set[int]]] = {}
+        columns = self.columns
+        for protocol, dst_hi, dst_lo, src_port, dst_port, ttl, src_hi, src_lo in zip(
+            columns["probe_protocol"],
+            columns["probe_dst_addr_hi"],
+            columns["probe_dst_addr_lo"],
+            columns["probe_src_port"],
+            columns["probe_dst_port"],
+            columns["probe_ttl"],
+            columns["reply_src_addr_hi"],
+            columns["reply_src_addr_lo"],
+        ):
+            flow = (protocol, dst_hi << 64 | dst_lo, src_port, dst_port)
+            addrs_by_ttl = addrs_by_flow.get(flow)
+            if addrs_by_ttl is None:
+                addrs_by_ttl = addrs_by_flow[flow] = {}
+            addrs = addrs_by_ttl.get(ttl)
+            if addrs is None:
+                addrs = addrs_by_ttl[ttl] = set()
+            addrs.add(src_hi << 64 | src_lo)
+        return addrs_by_flow
+
+
+Replies = Union[Sequence[Reply], ReplyStore]
+"""Replies, either as `pycaracal.Reply` objects or in a `ReplyStore`."""
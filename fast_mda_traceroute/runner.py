@@ -0,0 +1,149 @@
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from more_itertools import map_reduce, unique_everseen
+from pycaracal import Probe, Reply
+
+from fast_mda_traceroute.algorithms import DiamondMiner
+from fast_mda_traceroute.logger import logger
+from fast_mda_traceroute.metrics import get_reply_counts, get_ttl_metrics
+from fast_mda_traceroute.utils import interleave
+
+OnRound = Callable[[DiamondMiner, List[Probe]], None]
+"""Called after each round of an algorithm, with the probes of its next round."""
+
+OnMetrics = Callable[[dict], None]
+"""Called after each round with the metrics of the round."""
+
+
+def next_probes(
+    algs_by_dst: Dict[str, DiamondMiner],
+    replies: List[Reply],
+    on_round: Optional[OnRound] = None,
+    owners: Optional[Dict[str, str]] = None,
+) -> List[Probe]:
+    """
+    Dispatch the replies to the algorithms by probe destination, and return
+    the probes of their next round, interleaved in a single list.
+    The algorithms that have completed are removed from `algs_by_dst`.
+    `owners` maps the probed addresses to the key of their algorithm in `algs_by_dst`
+    when they differ, e.g. the addresses of a prefix.
+    """
+    owners = owners or {}
+    replies_by_dst = map_reduce(
+        replies, lambda x: owners.get(x.probe_dst_addr, x.probe_dst_addr)
+    )
+    probes_by_alg = []
+    for dst_addr, alg in list(algs_by_dst.items()):
+        alg_probes = alg.next_round(replies_by_dst.get(dst_addr, []))
+        if on_round:
+            on_round(alg, alg_probes)
+        if not alg_probes:
+            del algs_by_dst[dst_addr]
+        probes_by_alg.append(alg_probes)
+    return interleave(probes_by_alg)
+
+
+def timed_probe(
+    prober, probes: List[Probe], wait: int
+) -> Tuple[List[Reply], float, float]:
+    """
+    Send the probes, and return their replies with the time spent sending the probes
+    and the time spent waiting for the replies, in seconds. The prober waits `wait`
+    milliseconds once all the probes are sent, the remaining time is the send time.
+    """
+    start_time = perf_counter()
+    replies = prober.probe(probes, wait)
+    probe_time = perf_counter() - start_time
+    wait_time = min(wait / 1000, probe_time)
+    return replies, probe_time - wait_time, wait_time
+
+
+def run(
+    prober,
+    algs: Sequence[DiamondMiner],
+    probing_rate: int,
+    wait: int,
+    adaptive_wait: bool = False,
+    on_round: Optional[OnRound] = None,
+    on_metrics: Optional[OnMetrics] = None,
+) -> None:
+    """
+    Run the algorithms until they all complete.
+    The probes of all the algorithms are merged in a single stream sent through
+    the same prober, and the replies are dispatched back by probe destination.
+
+    With adaptive wait, `wait` is only an upper bound and the time to wait after
+    each round is derived from the RTTs observed by the algorithms.
+
+    `on_round` is called after each round of each algorithm, e.g. to write
+    the results while tracing, and `on_metrics` after each round with:
+    - the replies received for the probes of the previous round, the duplicate
+      replies, the replies that do not match any probe, and the reply rate;
+    - the time spent sending the probes (`send_time`), waiting for the replies
+      (`wait_time`), computing the links (`links_time`), generating the probes
+      (`probes_time`), and dispatching the replies and building the packets
+      (`dispatch_time`);
+    - the convergence at each TTL (cf. `metrics.get_ttl_metrics`).
+    """
+    algs_by_dst: Dict[str, DiamondMiner] = {alg.dst_addr: alg for alg in algs}
+    owners = {
+        addr: alg.dst_addr
+        for alg in algs
+        if alg.prefix_len is not None
+        for addr in alg.dst_addrs
+    }
+    # The records of the rounds are written once per round, for all the algorithms.
+    checkpoints = list(
+        unique_everseen(alg.checkpoint for alg in algs if alg.checkpoint)
+    )
+    replies: List[Reply] = []
+    send_time = wait_time = 0.0
+    sent: List[Probe] = []
+    current_round = 0
+    while True:
+        current_round += 1
+        round_algs = list(algs_by_dst.values())
+        start_time = perf_counter()
+        probes = next_probes(algs_by_dst, replies, on_round, owners)
+        next_probes_time = perf_counter() - start_time
+        for checkpoint in checkpoints:
+            checkpoint.flush()
+        round_wait = wait
+        if adaptive_wait and algs_by_dst:
+            round_wait = max(alg.adaptive_wait(wait) for alg in algs_by_dst.values())
+        logger.info(
+            "round=%d destinations=%d links_found=%d probes=%d wait=%dms expected_time=%.1fs",
+            current_round,
+            len(algs_by_dst),
+            sum(len(alg.links) for alg in algs),
+            len(probes),
+            round_wait,
+            len(probes) / probing_rate + round_wait / 1000,
+        )
+        if on_metrics:
+            duplicates, unmatched = get_reply_counts(sent, replies)
+            links_time = sum(x.round_timings["links"] for x in round_algs)
+            probes_time = sum(x.round_timings["probes"] for x in round_algs)
+            on_metrics(
+                dict(
+                    round=current_round,
+                    destinations=len(round_algs),
+                    probes=len(probes),
+                    wait=round_wait,
+                    replies=len(replies),
+                    duplicate_replies=duplicates,
+                    unmatched_replies=unmatched,
+                    reply_rate=len(replies) / max(len(sent), 1),
+                    send_time=send_time,
+                    wait_time=wait_time,
+                    links_time=links_time,
+                    probes_time=probes_time,
+                    dispatch_time=next_probes_time - links_time - probes_time,
+                    ttls=get_ttl_metrics(round_algs),
+                )
+            )
+        if not probes:
+            break
+        sent = probes
+        replies, send_time, wait_time = timed_probe(prober, probes, round_wait)
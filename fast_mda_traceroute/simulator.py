@@ -0,0 +1,211 @@
+from collections import defaultdict
+from hashlib import blake2b
+from random import Random
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from pycaracal import Probe, Reply
+
+from fast_mda_traceroute.utils import is_ipv4
+
+PROTOCOLS = {"icmp": 1, "icmp6": 58, "udp": 17}
+
+
+class Topology:
+    """
+    A synthetic topology, as a directed graph of interfaces, from the source
+    (the empty string) to the destination (any interface without successors).
+    Interfaces load-balance per flow, unless they are marked as per-packet.
+    """
+
+    def __init__(
+        self,
+        links: Iterable[Tuple[str, str]],
+        *,
+        per_packet: Iterable[str] = (),
+        unresponsive: Iterable[str] = (),
+        rate_limits: Optional[Dict[str, float]] = None,
+        latency: float = 1.0,
+        seed: int = 0,
+    ):
+        """
+        :param links: The (near interface, far interface) pairs, "" is the source.
+        :param per_packet: The interfaces that load-balance per packet.
+        :param unresponsive: The interfaces that never reply.
+        :param rate_limits: Maximum number of replies per second for some interfaces.
+        :param latency: One-way latency of each hop, in milliseconds.
+        :param seed: Seed of the per-flow hash, and of the per-packet choices.
+        """
+        self.successors: Dict[str, List[str]] = defaultdict(list)
+        for near_addr, far_addr in links:
+            self.successors[near_addr].append(far_addr)
+        self.per_packet = set(per_packet)
+        self.unresponsive = set(unresponsive)
+        self.rate_limits = rate_limits or {}
+        self.latency = latency
+        self.seed = seed
+        self.random = Random(seed)
+
+    @classmethod
+    def from_hops(
+        cls, hops: Sequence[Sequence[str]], *, meshed: bool = True, **kwargs
+    ) -> "Topology":
+        """
+        Build a topology from the interfaces at each TTL.
+        If `meshed`, each interface is connected to all the interfaces of the next hop,
+        otherwise they are spread evenly over the interfaces of the next hop.
+        """
+        links: List[Tuple[str, str]] = []
+        for near_hop, far_hop in zip([[""], *hops], hops):
+            width = len(near_hop)
+            for i, near_addr in enumerate(near_hop):
+                if meshed or width == 1:
+                    far_addrs = far_hop
+                elif len(far_hop) >= width:
+                    far_addrs = far_hop[i::width]
+                else:
+                    far_addrs = [far_hop[i % len(far_hop)]]
+                links.extend((near_addr, far_addr) for far_addr in far_addrs)
+        return cls(links, **kwargs)
+
+    @classmethod
+    def diamond(
+        cls, width: int, length: int, *, meshed: bool = False, **kwargs
+    ) -> "Topology":
+        """
+        A diamond of `length` hops of `width` interfaces each,
+        between a divergence point and a convergence point.
+        """
+        hops = [["10.0.0.1"]]
+        for i in range(length):
+            hops.append([f"10.{i + 1}.{j // 256}.{j % 256}" for j in range(width)])
+        hops.append([f"10.{length + 1}.0.1"])
+        return cls.from_hops(hops, meshed=meshed, **kwargs)
+
+    @property
+    def links(self) -> Set[Tuple[int, str, str]]:
+        """The links of the topology, by TTL, as discovered by traceroute."""
+        links = set()
+        near_addrs = self.successors[""]
+        ttl = 1
+        while near_addrs:
+            far_addrs = []
+            for near_addr in near_addrs:
+                for far_addr in self.successors.get(near_addr, []):
+                    links.add((ttl, near_addr, far_addr))
+                    far_addrs.append(far_addr)
+            near_addrs = list(dict.fromkeys(far_addrs))
+            ttl += 1
+        return links
+
+    def path(self, probe: Probe) -> List[str]:
+        """The interfaces traversed by a probe, up to its TTL."""
+        flow = f"{self.seed}|{probe.protocol}|{probe.dst_addr}|{probe.src_port}|{probe.dst_port}"
+        path: List[str] = []
+        addr = ""
+        while len(path) < probe.ttl and self.successors.get(addr):
+            successors = self.successors[addr]
+            if addr in self.per_packet:
+                addr = self.random.choice(successors)
+            else:
+                digest = blake2b(f"{flow}|{addr}".encode(), digest_size=8).digest()
+                addr = successors[int.from_bytes(digest, "big") % len(successors)]
+            path.append(addr)
+        return path
+
+
+class SimulatedProber:
+    """
+    A stand-in for `pycaracal.experimental.Prober` that replies from a `Topology`,
+    without network access. The time is simulated: the probes are sent at
+    `probing_rate`, and the replies that arrive later than `wait` after the last
+    probe is sent are lost.
+    """
+
+    def __init__(
+        self,
+        topology: Topology,
+        probing_rate: int = 100,
+        loss: float = 0.0,
+        destination_replies: bool = True,
+        seed: int = 0,
+    ):
+        self.topology = topology
+        self.probing_rate = probing_rate
+        self.loss = loss
+        self.destination_replies = destination_replies
+        self.random = Random(seed)
+        # Statistics
+        self.calls = 0
+        self.probes_sent = 0
+        self.time = 0.0
+        self.waits: List[int] = []
+        self.tokens: Dict[str, float] = {}
+        self.last_reply: Dict[str, float] = {}
+
+    def probe(self, probes: List[Probe], wait: int) -> List[Reply]:
+        self.calls += 1
+        self.waits.append(wait)
+        deadline = self.time + len(probes) / self.probing_rate + wait / 1000
+        replies = []
+        for i, probe in enumerate(probes):
+            send_time = self.time + i / self.probing_rate
+            reply = self.reply(probe, send_time)
+            if reply and reply.capture_timestamp <= deadline * 1e6:
+                replies.append(reply)
+        self.probes_sent += len(probes)
+        self.time = deadline
+        return sorted(replies, key=lambda x: x.capture_timestamp)
+
+    def reply(self, probe: Probe, send_time: float) -> Optional[Reply]:
+        path = self.topology.path(probe)
+        time_exceeded = len(path) == probe.ttl
+        if time_exceeded:
+            reply_src_addr = path[-1]
+        elif self.destination_replies:
+            reply_src_addr = probe.dst_addr
+        else:
+            return None
+        if reply_src_addr in self.topology.unresponsive:
+            return None
+        if self.loss and self.random.random() < self.loss:
+            return None
+        if not self.allow(reply_src_addr, send_time):
+            return None
+
+        ipv4 = is_ipv4(probe.dst_addr)
+        distance = len(path) if time_exceeded else len(path) + 1
+        rtt = 2 * self.topology.latency * distance
+        reply = Reply()
+        reply.capture_timestamp = int((send_time + rtt / 1000) * 1e6)
+        reply.probe_protocol = PROTOCOLS[probe.protocol]
+        reply.probe_dst_addr = probe.dst_addr
+        reply.probe_src_port = probe.src_port
+        reply.probe_dst_port = probe.dst_port
+        reply.probe_ttl = probe.ttl
+        reply.quoted_ttl = 1
+        reply.reply_src_addr = reply_src_addr
+        reply.reply_protocol = 1 if ipv4 else 58
+        reply.reply_ttl = 64 - distance
+        reply.rtt = int(rtt * 10)
+        if time_exceeded:
+            reply.reply_icmp_type = 11 if ipv4 else 3
+        elif probe.protocol == "udp":
+            reply.reply_icmp_type = 3 if ipv4 else 1
+            reply.reply_icmp_code = 3 if ipv4 else 4
+        else:
+            reply.reply_icmp_type = 0 if ipv4 else 129
+        return reply
+
+    def allow(self, addr: str, now: float) -> bool:
+        """Token bucket of one second for the rate-limited interfaces."""
+        rate = self.topology.rate_limits.get(addr)
+        if rate is None:
+            return True
+        elapsed = now - self.last_reply.get(addr, now)
+        tokens = min(rate, self.tokens.get(addr, rate) + elapsed * rate)
+        self.last_reply[addr] = now
+        if tokens < 1:
+            self.tokens[addr] = tokens
+            return False
+        self.tokens[addr] = tokens - 1
+        return True
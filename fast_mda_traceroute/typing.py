@@ -13,6 +13,11 @@ Pair = Tuple[int, Optional[Reply], Optional[Reply]]
 """A pair of replies between two consecutive TTLs, for the same flow ID."""
 
 
+class Algorithm(Enum):
+    DiamondMiner = "diamond-miner"
+    MDALite = "mda-lite"
+
+
 class AddressFamily(Enum):
     Any = "any"
     IPv4 = "4"
@@ -38,6 +43,8 @@ class LogLevel(Enum):
 
 
 class OutputFormat(Enum):
+    Binary = "binary"
+    JSONStream = "json-stream"
     ScamperJSON = "scamper-json"
     Table = "table"
     Traceroute = "traceroute"
@@ -1,3 +1,9 @@
+from math import ceil
+from typing import Iterable, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
 def is_ipv4(addr: str) -> bool:
     """
     >>> is_ipv4("8.8.8.8")
@@ -8,3 +14,33 @@ def is_ipv4(addr: str) -> bool:
     False
     """
     return "." in addr
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile of a non-empty sequence.
+    >>> percentile([1, 2, 3, 4], 50)
+    2
+    >>> percentile([1, 2, 3, 4], 95)
+    4
+    >>> percentile([7], 95)
+    7
+    """
+    values = sorted(values)
+    return values[max(ceil(q / 100 * len(values)), 1) - 1]
+
+
+def interleave(sequences: Iterable[Sequence[T]]) -> List[T]:
+    """
+    Merge sequences such that the elements of each sequence keep their order
+    and are evenly spaced in the result.
+    >>> interleave([[1, 2, 3, 4], ["a", "b"]])
+    [1, 'a', 2, 3, 'b', 4]
+    """
+    keyed = [
+        ((i + 0.5) / len(sequence), j, x)
+        for j, sequence in enumerate(sequences)
+        for i, x in enumerate(sequence)
+    ]
+    keyed.sort(key=lambda x: x[:2])
+    return [x for _, _, x in keyed]
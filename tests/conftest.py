@@ -1,6 +1,18 @@
+import random
+
 import pytest
 from pycaracal import Reply
 
+from fast_mda_traceroute.algorithms import DiamondMiner
+from fast_mda_traceroute.runner import run
+from fast_mda_traceroute.simulator import SimulatedProber
+
+
+@pytest.fixture(autouse=True)
+def seed_random():
+    # The probes are sent in a random order, the simulations are made reproducible.
+    random.seed(0)
+
 
 @pytest.fixture
 def make_reply():
@@ -11,6 +23,8 @@ def make_reply():
         probe_dst_port: int,
         probe_ttl: int,
         reply_src_addr: str,
+        reply_icmp_type: int = 11,
+        rtt: int = 0,
     ) -> Reply:
         reply = Reply()
         reply.probe_protocol = probe_protocol
@@ -19,6 +33,68 @@ def make_reply():
         reply.probe_dst_port = probe_dst_port
         reply.probe_ttl = probe_ttl
         reply.reply_src_addr = reply_src_addr
+        reply.reply_protocol = 1
+        reply.reply_icmp_type = reply_icmp_type
+        reply.rtt = rtt
         return reply
 
     return _make_reply
+
+
+@pytest.fixture
+def simulate():
+    def _simulate(
+        topology,
+        algorithm=DiamondMiner,
+        *,
+        dst_addr="192.0.2.1",
+        dst_addrs=None,
+        min_ttl=1,
+        max_ttl=8,
+        protocol="icmp",
+        confidence=95,
+        max_round=10,
+        prober=None,
+        probing_rate=100,
+        wait=1000,
+        loss=0.0,
+        seed=0,
+        adaptive_wait=False,
+        on_round=None,
+        on_metrics=None,
+        **kwargs,
+    ):
+        """
+        Trace `dst_addr` (or each of `dst_addrs`) on `topology`, and return
+        the algorithm (or the list of algorithms) and the prober.
+        """
+        if prober is None:
+            prober = SimulatedProber(
+                topology, probing_rate=probing_rate, loss=loss, seed=seed
+            )
+        algs = [
+            algorithm(
+                x,
+                min_ttl,
+                max_ttl,
+                24000,
+                33434,
+                protocol,
+                confidence,
+                max_round,
+                **kwargs,
+            )
+            for x in dst_addrs or [dst_addr]
+        ]
+        run(
+            prober,
+            algs,
+            probing_rate,
+            wait,
+            adaptive_wait=adaptive_wait,
+            on_round=on_round,
+            on_metrics=on_metrics,
+        )
+        return (algs if dst_addrs else algs[0]), prober
+
+    return _simulate
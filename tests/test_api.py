@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+from fast_mda_traceroute.api import Tracer, trace
+from fast_mda_traceroute.simulator import SimulatedProber, Topology
+
+
+class SlowProber(SimulatedProber):
+    def probe(self, probes, wait):
+        time.sleep(0.1)
+        return super().probe(probes, wait)
+
+
+def test_trace():
+    topology = Topology.diamond(2, 2)
+    tracer = Tracer(SimulatedProber(topology))
+    result = asyncio.run(trace("192.0.2.1", tracer, max_ttl=8))
+    assert result.dst_addr == "192.0.2.1"
+    assert result.links == topology.links
+    assert result.destination_ttl == 5
+    assert result.probes == tracer.prober.probes_sent
+    assert result.rounds == tracer.prober.calls
+    tracer.close()
+
+
+def test_trace_concurrent():
+    topology = Topology.diamond(2, 2)
+    tracer = Tracer(SimulatedProber(topology))
+    dst_addrs = ["192.0.2.1", "192.0.2.2", "192.0.2.3"]
+
+    async def main():
+        return await asyncio.gather(
+            *(trace(dst_addr, tracer, max_ttl=8) for dst_addr in dst_addrs)
+        )
+
+    results = asyncio.run(main())
+    assert [x.dst_addr for x in results] == dst_addrs
+    assert all(x.links == topology.links for x in results)
+    # The rounds of the traces are sent together.
+    assert tracer.prober.calls == max(x.rounds for x in results)
+    tracer.close()
+
+
+def test_trace_event_loops():
+    tracer = Tracer(SimulatedProber(Topology.diamond(2, 2)))
+    # The same tracer can be used from successive event loops.
+    for dst_addr in ("192.0.2.1", "192.0.2.2"):
+        asyncio.run(trace(dst_addr, tracer, max_ttl=8))
+    tracer.close()
+
+
+def test_trace_timeout():
+    tracer = Tracer(SlowProber(Topology.diamond(2, 2)))
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(trace("192.0.2.1", tracer, max_ttl=8, timeout=0.05))
+    tracer.close()
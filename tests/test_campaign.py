@@ -0,0 +1,67 @@
+import io
+import json
+import os
+import signal
+
+import pytest
+
+from fast_mda_traceroute.campaign import plan_workers, run_campaign
+from fast_mda_traceroute.simulator import SimulatedProber, Topology
+
+
+def make_prober(interface, probing_rate, instance_id):
+    return SimulatedProber(Topology.diamond(2, 2), probing_rate)
+
+
+def make_crashing_prober(interface, probing_rate, instance_id):
+    if interface == "crash":
+        os.kill(os.getpid(), signal.SIGKILL)
+    return make_prober(interface, probing_rate, instance_id)
+
+
+def test_plan_workers():
+    dst_addrs = [f"192.0.2.{i}" for i in range(10)]
+    workers = plan_workers(dst_addrs, ["eth0", "eth1"], 1000, 2, instance_id=10)
+    assert [x.interface for x in workers] == ["eth0", "eth1", "eth0", "eth1"]
+    assert [x.instance_id for x in workers] == [10, 11, 12, 13]
+    # The global probing rate is split between the workers.
+    assert sum(x.probing_rate for x in workers) == 1000
+    assert sorted(sum((x.dst_addrs for x in workers), [])) == sorted(dst_addrs)
+    # There are fewer workers than the probing rate.
+    workers = plan_workers(dst_addrs, ["eth0", "eth1"], 3, 2)
+    assert [x.probing_rate for x in workers] == [1, 1, 1]
+
+
+def test_run_campaign():
+    dst_addrs = [f"192.0.2.{i}" for i in range(1, 6)]
+    output = io.StringIO()
+    run_campaign(
+        dst_addrs,
+        ["sim0", "sim1"],
+        100_000,
+        output,
+        max_ttl=8,
+        make_prober=make_prober,
+    )
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    summaries = [x for x in records if x["type"] == "summary"]
+    assert sorted(x["dst_addr"] for x in summaries) == dst_addrs
+    assert all(x["links"] == 6 for x in summaries)
+
+
+def test_run_campaign_crash():
+    dst_addrs = [f"192.0.2.{i}" for i in range(1, 5)]
+    output = io.StringIO()
+    with pytest.raises(RuntimeError):
+        run_campaign(
+            dst_addrs,
+            ["sim0", "crash"],
+            100_000,
+            output,
+            max_ttl=8,
+            make_prober=make_crashing_prober,
+        )
+    # The output of the other worker is written.
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    summaries = [x for x in records if x["type"] == "summary"]
+    assert sorted(x["dst_addr"] for x in summaries) == dst_addrs[0::2]
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from fast_mda_traceroute.algorithms import DiamondMiner
+from fast_mda_traceroute.checkpoint import Checkpoint
+from fast_mda_traceroute.simulator import Topology
+
+
+def test_checkpoint_resume(tmp_path, simulate):
+    topology = Topology.diamond(4, 3, meshed=True)
+    path = tmp_path / "checkpoint.jsonl"
+    # Interrupted trace
+    simulate(topology, max_round=2, checkpoint=Checkpoint(path))
+    assert [x["round"] for x in Checkpoint(path).read("192.0.2.1")] == [1, 2]
+    # Resumed trace
+    resumed, resumed_prober = simulate(topology, checkpoint=Checkpoint(path))
+    full, full_prober = simulate(topology)
+    assert resumed.links == full.links
+    assert resumed.probes_sent == full.probes_sent
+    assert len(resumed.replies) == len(full.replies)
+    assert resumed_prober.probes_sent < full_prober.probes_sent
+
+
+def test_checkpoint_flush(tmp_path, monkeypatch, simulate):
+    fsyncs = []
+    monkeypatch.setattr(os, "fsync", fsyncs.append)
+    checkpoint = Checkpoint(tmp_path / "checkpoint.jsonl")
+    algs, _ = simulate(
+        Topology.diamond(2, 2),
+        dst_addrs=["192.0.2.1", "192.0.2.2", "192.0.2.3"],
+        checkpoint=checkpoint,
+    )
+    # The records of all the destinations are written once per round.
+    rounds = max(alg.current_round for alg in algs)
+    assert len(fsyncs) == rounds - 1
+    assert not checkpoint.pending
+    for alg in algs:
+        records = Checkpoint(checkpoint.path).read(alg.dst_addr)
+        assert [x["round"] for x in records] == list(range(1, alg.current_round))
+
+
+def test_checkpoint_truncated(tmp_path, simulate):
+    topology = Topology.diamond(2, 2)
+    path = tmp_path / "checkpoint.jsonl"
+    simulate(topology, max_round=1, checkpoint=Checkpoint(path))
+    with path.open("a") as f:
+        f.write('{"dst_addr": "192.0.2.1", "round": 2, "pro')
+    simulate(topology, max_round=2, checkpoint=Checkpoint(path))
+    assert [x["round"] for x in Checkpoint(path).read("192.0.2.1")] == [1, 2]
+
+
+def test_checkpoint_mismatch(tmp_path, simulate):
+    path = tmp_path / "checkpoint.jsonl"
+    simulate(Topology.diamond(2, 2), max_round=1, checkpoint=Checkpoint(path))
+    alg = DiamondMiner("192.0.2.1", 1, 4, 24000, 33434, "icmp", 95, 10)
+    alg.checkpoint = Checkpoint(path)
+    with pytest.raises(ValueError):
+        alg.next_round([])
+
+
+def test_checkpoint_resume_rate_limiting(tmp_path, simulate):
+    hops = [
+        ["10.0.0.1"],
+        [f"10.1.0.{i}" for i in range(8)],
+        [f"10.2.0.{i}" for i in range(8)],
+        ["10.3.0.1"],
+    ]
+    rate_limits = {addr: 10 for hop in hops for addr in hop}
+    topology = Topology.from_hops(hops, rate_limits=rate_limits)
+    path = tmp_path / "checkpoint.jsonl"
+    interrupted, _ = simulate(
+        topology,
+        max_round=4,
+        probing_rate=1000,
+        checkpoint=Checkpoint(path),
+        retries=2,
+    )
+    assert interrupted.rate_limited_ttls
+    # The rounds are replayed in the order their probes were sent.
+    replayed = DiamondMiner("192.0.2.1", 1, 8, 24000, 33434, "icmp", 95, 30, retries=2)
+    replayed.checkpoint = Checkpoint(path)
+    assert replayed.next_round([])
+    assert replayed.ttl_caps == interrupted.ttl_caps
+    assert replayed.rate_limited_ttls == interrupted.rate_limited_ttls
+    resumed, _ = simulate(
+        topology,
+        max_round=30,
+        probing_rate=1000,
+        checkpoint=Checkpoint(path),
+        retries=2,
+    )
+    assert resumed.links == topology.links
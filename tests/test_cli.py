@@ -1,10 +1,13 @@
 import pytest
 from typer.testing import CliRunner
 
-from fast_mda_traceroute.cli import app
+from fast_mda_traceroute.algorithms import DiamondMiner
+from fast_mda_traceroute.cli import app, traces
 
 
-@pytest.mark.parametrize("format", ["table", "traceroute", "scamper-json"])
+@pytest.mark.parametrize(
+    "format", ["table", "traceroute", "scamper-json", "json-stream", "binary"]
+)
 def test_cli_basic(format):
     runner = CliRunner()
     result = runner.invoke(
@@ -25,3 +28,43 @@ def test_cli_version():
     result = runner.invoke(app, ["--version"])
     assert result.exit_code == 0
     assert result.stdout.startswith("fast-mda-traceroute")
+
+
+def test_cli_targets():
+    runner = CliRunner()
+    result = runner.invoke(
+        app,
+        ["--print-command=scamper", "--targets=-"],
+        input="8.8.8.8\n# Comment\n\n1.1.1.1\n8.8.8.8\n",
+    )
+    assert result.exit_code == 0
+    assert len(result.stdout.splitlines()) == 2
+
+
+def test_cli_no_destination():
+    runner = CliRunner()
+    result = runner.invoke(app, [])
+    assert result.exit_code != 0
+
+
+def test_cli_port_range():
+    runner = CliRunner()
+    result = runner.invoke(app, ["--src-port=65535", "--src-port-count=2", "8.8.8.8"])
+    assert result.exit_code == 2
+    assert "port ranges" in result.output
+
+
+def test_cli_traces_prefix(make_reply):
+    alg = DiamondMiner("192.0.2.1", 1, 2, 24000, 33434, "icmp", 95, 10, prefix_len=24)
+    alg.next_round([])
+    alg.next_round(
+        [
+            make_reply(1, "192.0.2.0", 24000, 33434, 1, "10.0.0.1"),
+            make_reply(1, "192.0.2.0", 24000, 33434, 2, "10.0.0.2"),
+        ]
+    )
+    alg.next_round([])
+    # The probed addresses without replies are also traced.
+    dst_addrs = [dst_addr for _, dst_addr, _, _ in traces([alg], True)]
+    assert dst_addrs == [f"192.0.2.{i}" for i in range(6)]
+    assert list(alg.time_exceeded_replies_by_dst()) == ["192.0.2.0"]
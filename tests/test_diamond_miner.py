@@ -0,0 +1,211 @@
+import random
+
+import pytest
+
+from fast_mda_traceroute.algorithms import DiamondMiner
+from fast_mda_traceroute.simulator import SimulatedProber, Topology
+
+
+class PerTTLDiamondMiner(DiamondMiner):
+    """Diamond-Miner without `Proposition 1`."""
+
+    def max_flow_by_ttl(self):
+        return {
+            ttl: self.link_budget(ttl, links)
+            for ttl, links in self.links_by_ttl.items()
+        }
+
+
+def probe_ttls(probes):
+    return {probe.ttl for probe in probes}
+
+
+def test_diamond_miner_destination_ttl(make_reply):
+    alg = DiamondMiner("::9", 1, 32, 24000, 33434, "icmp", 95, 10, initial_max_ttl=8)
+    assert probe_ttls(alg.next_round([])) == set(range(1, 9))
+    replies = [
+        make_reply(58, "::9", 24000, 33434, ttl, f"::{ttl}") for ttl in range(1, 4)
+    ]
+    replies.append(make_reply(58, "::9", 24000, 33434, 4, "::9", reply_icmp_type=0))
+    replies.append(make_reply(58, "::9", 24000, 33434, 5, "::9", reply_icmp_type=0))
+    assert probe_ttls(alg.next_round(replies)) == {1, 2, 3}
+    assert alg.destination_ttl == 4
+
+
+def test_diamond_miner_prefix_destination_ttl(simulate):
+    topology = Topology.diamond(4, 2)
+    alg, _ = simulate(topology, max_ttl=32, initial_max_ttl=8, prefix_len=24)
+    assert alg.links == topology.links
+    # The TTL range is not extended past the farthest address.
+    assert alg.destination_ttl == max(alg.destination_ttls.values()) == 5
+    assert alg.max_probed_ttl == 8
+
+
+def test_diamond_miner_adaptive_wait(make_reply):
+    alg = DiamondMiner("::9", 1, 2, 24000, 33434, "icmp", 95, 10)
+    alg.next_round([])
+    replies = [
+        make_reply(58, "::9", 24000 + i, 33434, 1, "::1", rtt=5000 if i < 872 else 100)
+        for i in range(1000)
+    ]
+    replies.append(make_reply(58, "::9", 24000, 33434, 2, "::2", rtt=100))
+    assert probe_ttls(alg.next_round(replies)) == {1, 2}
+    # Only the last RTTs are kept: 2 * 10ms + 50ms.
+    assert len(alg.rtts_by_ttl[1]) == 128
+    assert alg.adaptive_wait(1000) == 70
+
+
+def test_diamond_miner_extend_ttl_range(make_reply):
+    alg = DiamondMiner("::9", 1, 20, 24000, 33434, "icmp", 95, 10, initial_max_ttl=8)
+    alg.next_round([])
+    replies = [
+        make_reply(58, "::9", 24000, 33434, ttl, f"::{ttl}") for ttl in range(1, 9)
+    ]
+    assert probe_ttls(alg.next_round(replies)) == set(range(1, 17))
+    assert alg.max_probed_ttl == 16
+
+
+def test_diamond_miner_min_ttl(simulate):
+    hops = [[f"10.0.{i}.1"] for i in range(20)]
+    hops += [["10.1.0.1", "10.1.0.2"], ["10.2.0.1"]]
+    topology = Topology.from_hops(hops)
+    # The initial maximum TTL is below the minimum TTL.
+    alg, _ = simulate(topology, min_ttl=18, max_ttl=32, initial_max_ttl=16)
+    assert min(alg.probes_sent) == 18
+    assert alg.links == {link for link in topology.links if link[0] >= 18}
+    assert alg.destination_ttl == 23
+
+
+def test_diamond_miner_gap_limit(make_reply):
+    alg = DiamondMiner("::9", 1, 20, 24000, 33434, "icmp", 95, 10, initial_max_ttl=8)
+    alg.next_round([])
+    replies = [
+        make_reply(58, "::9", 24000, 33434, ttl, f"::{ttl}") for ttl in range(1, 4)
+    ]
+    assert probe_ttls(alg.next_round(replies)) == {1, 2, 3}
+    assert alg.max_probed_ttl == 8
+
+
+@pytest.mark.parametrize(
+    "hops",
+    [
+        [
+            ["fd00::1"],
+            ["fd00::2:1", "fd00::2:2"],
+            ["fd00::3:1", "fd00::3:2", "fd00::3:3", "fd00::3:4"],
+            ["fd00::4"],
+        ],
+        [["fd00::1"], ["fd00::2"], ["fd00::3:1", "fd00::3:2", "fd00::3:3"]],
+    ],
+)
+def test_diamond_miner_proposition_1(hops, simulate):
+    topology = Topology.from_hops(hops)
+    prober = SimulatedProber(topology)
+    options = dict(dst_addr="::9", max_ttl=32, confidence=99, prober=prober, wait=0)
+    alg, _ = simulate(topology, **options)
+    assert alg.links == topology.links
+    assert alg.current_round <= 6
+    # Without Proposition 1, the links are not observed on enough flows.
+    alg, _ = simulate(topology, PerTTLDiamondMiner, **options)
+    assert alg.links < topology.links
+
+
+def test_diamond_miner_warm_start(simulate):
+    topology = Topology.diamond(4, 3, meshed=True)
+    cold, cold_prober = simulate(topology)
+    warm, warm_prober = simulate(topology, prior_links_by_ttl=cold.links_by_ttl)
+    assert warm.links == cold.links
+    assert warm.current_round < cold.current_round
+    assert warm_prober.calls == 1
+    assert cold_prober.calls > 2
+
+
+def test_diamond_miner_flow_ids_exhausted(simulate):
+    topology = Topology.diamond(16, 2)
+    alg, _ = simulate(
+        topology,
+        protocol="udp",
+        confidence=99,
+        src_port_count=4,
+        dst_port_count=5,
+    )
+    assert alg.exhausted_ttls
+    assert max(alg.probes_sent.values()) == 20
+    flows = {(x.probe_src_port, x.probe_dst_port) for x in alg.replies}
+    assert len(flows) == 20
+    assert {alg.flow_id(x) for x in alg.replies} == set(range(20))
+
+
+def test_diamond_miner_per_packet(simulate):
+    topology = Topology.diamond(8, 2)
+    alg, prober = simulate(topology, max_round=30)
+    assert not alg.per_packet_ttls
+    per_flow_probes = prober.probes_sent
+    # The divergence point load-balances per packet: the next TTLs reply from a
+    # random interface at each probe, which would look like ever more links.
+    topology = Topology.diamond(8, 2, per_packet=["10.0.0.1"])
+    alg, prober = simulate(topology, max_round=30)
+    assert 2 in alg.per_packet_ttls
+    assert alg.current_round < 30
+    assert prober.probes_sent <= per_flow_probes
+
+
+def test_diamond_miner_rate_limiting(simulate):
+    hops = [
+        ["10.0.0.1"],
+        [f"10.1.0.{i}" for i in range(8)],
+        [f"10.2.0.{i}" for i in range(8)],
+        ["10.3.0.1"],
+    ]
+    rate_limits = {addr: 10 for hop in hops for addr in hop}
+    topology = Topology.from_hops(hops, rate_limits=rate_limits)
+    alg, _ = simulate(topology, max_round=30, probing_rate=1000, retries=2)
+    assert alg.rate_limited_ttls
+    # The flows lost to rate limiting are sent again, and do not appear as links
+    # to (or from) unknown interfaces.
+    assert alg.links == topology.links
+    assert sum(alg.retransmissions.values()) > 0
+    # The caps are removed once the replies recover.
+    assert not alg.ttl_caps
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_diamond_miner_rate_limiting_unresponsive(seed, simulate):
+    # The replies lost to an unresponsive interface are not mistaken for rate limiting.
+    random.seed(seed)
+    topology = Topology.diamond(8, 2)
+    topology.unresponsive = {"10.1.0.0", "10.2.0.1"}
+    alg, _ = simulate(topology, max_round=30, seed=seed)
+    assert not alg.rate_limited_ttls
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_diamond_miner_retries(seed, simulate):
+    topology = Topology.diamond(16, 3)
+    results = {}
+    for retries in (0, 2):
+        random.seed(seed)
+        alg, prober = simulate(
+            topology, max_ttl=10, max_round=30, loss=0.05, seed=seed, retries=retries
+        )
+        stars = {link for link in alg.links if not all(link)}
+        results[retries] = prober.probes_sent, stars
+    # The lost replies are recovered by sending the same flows again,
+    # instead of new flows to discover the links to unknown addresses.
+    assert results[2][0] < results[0][0]
+    assert len(results[2][1]) < len(results[0][1])
+    assert all(count <= 2 for count in alg.retransmissions.values())
+
+
+def test_diamond_miner_retries_unresponsive(simulate):
+    topology = Topology.diamond(4, 2)
+    topology.unresponsive = {"10.1.0.0", "10.2.0.1"}
+    results = {}
+    for retries in (0, 2):
+        alg, prober = simulate(topology, max_ttl=10, max_round=30, retries=retries)
+        results[retries] = prober.calls, prober.probes_sent
+    # The unanswered flows are sent again once with the new flows, and not anymore
+    # once found to go through an unresponsive interface.
+    assert results[2][0] == results[0][0]
+    assert results[2][1] <= results[0][1] + 4
+    assert alg.silent_ttls == {2, 3}
@@ -0,0 +1,58 @@
+from socket import AF_INET, AF_INET6, gaierror
+
+import pytest
+
+from fast_mda_traceroute import dns
+from fast_mda_traceroute.dns import Resolver, resolve
+from fast_mda_traceroute.typing import AddressFamily
+
+ANSWERS = {
+    "example.org": [
+        (AF_INET6, 0, 0, "", ("2001:db8::1", 0, 0, 0)),
+        (AF_INET, 0, 0, "", ("192.0.2.2", 0)),
+        (AF_INET, 0, 0, "", ("192.0.2.1", 0)),
+    ]
+}
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    lookups = []
+
+    def getaddrinfo(host, port, family):
+        lookups.append(host)
+        if host not in ANSWERS:
+            raise gaierror(f"Unknown host {host}")
+        return [x for x in ANSWERS[host] if family in (0, x[0])]
+
+    monkeypatch.setattr(dns, "getaddrinfo", getaddrinfo)
+    return lookups
+
+
+def test_resolve(lookups):
+    assert resolve("example.org", AddressFamily.Any) == [
+        "192.0.2.1",
+        "192.0.2.2",
+        "2001:db8::1",
+    ]
+    assert resolve("example.org", AddressFamily.IPv6) == ["2001:db8::1"]
+    assert resolve("2001:db8::0001", AddressFamily.Any) == ["2001:db8::1"]
+    assert lookups == ["example.org", "example.org"]
+
+
+def test_resolver(lookups, tmp_path):
+    path = tmp_path / "dns.json"
+    hosts = ["example.org", "example.net", "example.org"]
+    results = Resolver(path).resolve_all(hosts, AddressFamily.IPv4)
+    assert results["example.org"] == ["192.0.2.1", "192.0.2.2"]
+    assert isinstance(results["example.net"], gaierror)
+    assert sorted(lookups) == ["example.net", "example.org"]
+    # The addresses are cached on disk, but not the failures.
+    results = Resolver(path).resolve_all(hosts, AddressFamily.IPv4)
+    assert results["example.org"] == ["192.0.2.1", "192.0.2.2"]
+    assert sorted(lookups) == ["example.net", "example.net", "example.org"]
+    # The cached addresses expire.
+    resolver = Resolver(ttl=0)
+    resolver.resolve("example.org", AddressFamily.IPv4)
+    resolver.resolve("example.org", AddressFamily.IPv4)
+    assert lookups.count("example.org") == 3
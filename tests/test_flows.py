@@ -0,0 +1,22 @@
+import pytest
+from diamond_miner.mappers import SequentialFlowMapper
+
+from fast_mda_traceroute.flows import MultiFlowMapper
+
+
+def test_multi_flow_mapper():
+    mapper = MultiFlowMapper(prefix_size=4, src_port_count=3, dst_port_count=5)
+    assert mapper.size == 60
+    offsets = [mapper.offsets(flow_id) for flow_id in range(mapper.size)]
+    assert len(set(offsets)) == mapper.size
+    for flow_id, offset in enumerate(offsets):
+        assert mapper.flow_id(*offset) == flow_id
+    with pytest.raises(ValueError):
+        mapper.offsets(mapper.size)
+
+
+def test_multi_flow_mapper_sequential():
+    mapper = MultiFlowMapper(src_port_count=1000)
+    sequential = SequentialFlowMapper(prefix_size=1)
+    for flow_id in range(1000):
+        assert mapper.offsets(flow_id)[:2] == sequential.offset(flow_id)
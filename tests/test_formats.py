@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from fast_mda_traceroute.formats import (
+    format_binary,
+    format_scamper_json,
+    format_table,
+    load_binary,
+)
+from fast_mda_traceroute.links import get_links_by_ttl
+from fast_mda_traceroute.simulator import Topology
+from fast_mda_traceroute.typing import Protocol
+
+
+def test_format_binary(tmp_path, simulate):
+    topology = Topology.diamond(4, 2, meshed=True)
+    algs, _ = simulate(topology, dst_addrs=["192.0.2.1", "2001:db8::1"])
+    path = tmp_path / "trace.bin"
+    with path.open("wb") as f:
+        for alg in algs:
+            f.write(format_binary(alg.dst_addr, alg.replies, alg.links))
+    traces = load_binary(path)
+    assert len(traces) == 2
+    for alg, trace in zip(algs, traces):
+        assert trace.dst_addr == alg.dst_addr
+        assert trace.links_by_ttl == alg.links_by_ttl
+        assert list(trace.replies) == list(alg.replies)
+        assert get_links_by_ttl(trace.replies.time_exceeded()) == alg.links_by_ttl
+
+
+def test_load_binary_empty(tmp_path):
+    path = tmp_path / "trace.bin"
+    path.touch()
+    assert load_binary(path) == []
+
+
+def test_format_per_packet(make_reply):
+    replies = [
+        make_reply(1, "::9", 24000, 33434, 1, "::1"),
+        make_reply(1, "::9", 24000, 33434, 1, "::1"),
+        make_reply(1, "::9", 24000, 33434, 2, "::2"),
+        make_reply(1, "::9", 24000, 33434, 2, "::3"),
+    ]
+    rows = format_table(replies).splitlines()[2:]
+    assert len(rows) == 3
+    assert [row.endswith("yes") for row in rows] == [False, True, True]
+    _, tracelb, _ = format_scamper_json(
+        95,
+        100,
+        "host",
+        "::8",
+        "::9",
+        Protocol.ICMP,
+        1,
+        24000,
+        33434,
+        1000,
+        datetime.now(),
+        datetime.now(),
+        {1: 1, 2: 1},
+        replies,
+    )
+    assert tracelb["per_packet_ttls"] == [2]
+    assert tracelb["linkc"] == 2
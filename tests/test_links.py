@@ -1,9 +1,14 @@
 from fast_mda_traceroute.links import (
+    LinkIndex,
+    get_addrs_by_flow,
+    get_flow_links,
     get_links_by_ttl,
     get_pairs_by_flow,
+    get_per_packet_ttls,
     get_replies_by_flow,
     get_replies_by_ttl,
     get_scamper_links,
+    unique_replies,
 )
 
 
@@ -80,6 +85,41 @@ def test_get_links_by_ttl(make_reply):
     }
 
 
+def test_get_links_by_ttl_duplicates(make_reply):
+    # Duplicate and per-packet replies must give the same links as the pairs.
+    replies = [
+        make_reply(1, "::9", 24000, 33434, 1, "::1"),
+        make_reply(1, "::9", 24000, 33434, 1, "::1"),
+        make_reply(1, "::9", 24000, 33434, 2, "::2"),
+        make_reply(1, "::9", 24000, 33434, 2, "::3"),
+        make_reply(1, "::9", 24000, 33434, 2, "::2"),
+        make_reply(1, "::9", 24001, 33434, 2, "::2"),
+    ]
+    expected = {}
+    for pairs in get_pairs_by_flow(replies).values():
+        for near_ttl, near_reply, far_reply in pairs:
+            expected.setdefault(near_ttl, set()).add(
+                (
+                    near_ttl,
+                    near_reply.reply_src_addr if near_reply else None,
+                    far_reply.reply_src_addr if far_reply else None,
+                )
+            )
+    assert get_links_by_ttl(replies) == expected
+
+
+def test_get_addrs_by_flow(make_reply):
+    replies = [
+        make_reply(1, "::9", 24000, 33434, 1, "::1"),
+        make_reply(1, "::9", 24000, 33434, 1, "::1"),
+        make_reply(1, "::9", 24001, 33434, 2, "::2"),
+    ]
+    assert get_addrs_by_flow(replies) == {
+        (1, "::9", 24000, 33434): {1: {"::1"}},
+        (1, "::9", 24001, 33434): {2: {"::2"}},
+    }
+
+
 def test_get_scamper_links(make_reply):
     replies_flow_1 = [
         make_reply(1, "::9", 24000, 33434, 1, "::1"),
@@ -97,3 +137,56 @@ def test_get_scamper_links(make_reply):
         },
         "::2": {3: {"::3": [replies_flow_1[2]]}},
     }
+
+
+def test_get_scamper_links_per_packet(make_reply):
+    # Flow 1 is answered twice at TTL 1, and from two addresses at TTL 2.
+    replies = [
+        make_reply(1, "::9", 24000, 33434, 1, "::1"),
+        make_reply(1, "::9", 24000, 33434, 1, "::1"),
+        make_reply(1, "::9", 24000, 33434, 2, "::2"),
+        make_reply(1, "::9", 24000, 33434, 2, "::3"),
+        make_reply(1, "::9", 24000, 33434, 3, "::4"),
+    ]
+    assert get_per_packet_ttls(replies) == {2}
+    assert unique_replies(replies) == [replies[0], *replies[2:]]
+    assert get_scamper_links(replies) == {
+        "::1": {2: {"::2": [replies[2]], "::3": [replies[3]]}},
+        "::2": {3: {"::4": [replies[4]]}},
+        "::3": {3: {"::4": [replies[4]]}},
+    }
+
+
+def test_get_flow_links():
+    assert get_flow_links({1: {"::1"}, 2: {"::2", "::3"}, 4: {"::4"}}) == {
+        (1, "::1", "::2"),
+        (1, "::1", "::3"),
+        (2, "::2", None),
+        (2, "::3", None),
+        (3, None, "::4"),
+    }
+
+
+def test_link_index(make_reply):
+    round_1 = [
+        make_reply(1, "::9", 24000, 33434, 1, "::1"),
+        make_reply(1, "::9", 24000, 33434, 3, "::3"),
+        make_reply(1, "::9", 24001, 33434, 1, "::1"),
+    ]
+    round_2 = [
+        make_reply(1, "::9", 24000, 33434, 2, "::2"),
+        make_reply(1, "::9", 24001, 33434, 2, "::4"),
+        make_reply(1, "::9", 24001, 33434, 2, "::4"),
+    ]
+    index = LinkIndex()
+    index.add(round_1)
+    assert index.links_by_ttl == get_links_by_ttl(round_1)
+    added, removed = index.add(round_2)
+    assert index.links_by_ttl == get_links_by_ttl([*round_1, *round_2])
+    assert added == {(1, "::1", "::2"), (1, "::1", "::4"), (2, "::2", "::3")}
+    assert removed == {(1, "::1", None), (2, None, "::3")}
+    assert index.links == {
+        (1, "::1", "::2"),
+        (1, "::1", "::4"),
+        (2, "::2", "::3"),
+    }
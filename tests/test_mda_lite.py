@@ -0,0 +1,71 @@
+import json
+from datetime import datetime
+from io import StringIO
+
+from fast_mda_traceroute.algorithms import DiamondMiner, MDALite
+from fast_mda_traceroute.formats import JSONStreamWriter, format_scamper_json
+from fast_mda_traceroute.prior import get_tracelb_links
+from fast_mda_traceroute.simulator import Topology
+from fast_mda_traceroute.typing import Protocol
+
+
+def test_mda_lite_unmeshed(simulate):
+    topology = Topology.diamond(4, 3)
+    dminer, dminer_prober = simulate(topology, DiamondMiner, max_ttl=10, max_round=30)
+    mda_lite, mda_lite_prober = simulate(topology, MDALite, max_ttl=10, max_round=30)
+    assert dminer.links == mda_lite.links == topology.links
+    assert not mda_lite.meshed_ttls
+    # The hops with a single vertex are probed with the flows needed to rule out
+    # a second vertex, and their links are inferred.
+    assert mda_lite.probes_sent[1] == 6
+    assert dminer.probes_sent[1] == 21
+    assert mda_lite_prober.probes_sent < dminer_prober.probes_sent
+
+
+def test_mda_lite_meshed(simulate):
+    topology = Topology.diamond(4, 2, meshed=True)
+    dminer, _ = simulate(topology, DiamondMiner, max_ttl=10, max_round=30)
+    mda_lite, _ = simulate(topology, MDALite, max_ttl=10, max_round=30)
+    # The meshed hop pair is traced with the Diamond-Miner budget.
+    assert mda_lite.meshed_ttls == {2}
+    assert dminer.links == mda_lite.links == topology.links
+    assert mda_lite.probes_sent[2] == dminer.probes_sent[2]
+
+
+def test_mda_lite_outputs(simulate):
+    topology = Topology.diamond(4, 3)
+    output = StringIO()
+    alg, _ = simulate(
+        topology,
+        MDALite,
+        max_ttl=10,
+        max_round=30,
+        on_round=JSONStreamWriter(output),
+    )
+    # The inferred links are in the outputs, although no flow was traced through them.
+    *rounds, summary = [json.loads(line) for line in output.getvalue().splitlines()]
+    links = set()
+    for record in rounds:
+        links |= {tuple(x) for x in record["links"]}
+        links -= {tuple(x) for x in record["removed_links"]}
+    assert links == topology.links
+    assert summary["links"] == len(topology.links)
+    _, tracelb, _ = format_scamper_json(
+        95,
+        100,
+        "host",
+        "192.0.2.0",
+        alg.dst_addr,
+        Protocol.ICMP,
+        1,
+        24000,
+        33434,
+        1000,
+        datetime.now(),
+        datetime.now(),
+        alg.probes_sent,
+        alg.time_exceeded_replies,
+        alg.links,
+    )
+    links = set().union(*get_tracelb_links(tracelb).values())
+    assert links == topology.links
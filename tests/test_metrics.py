@@ -0,0 +1,51 @@
+from pycaracal import Probe
+
+from fast_mda_traceroute.algorithms import DiamondMiner, MDALite
+from fast_mda_traceroute.metrics import get_reply_counts, get_ttl_metrics
+
+
+def test_get_reply_counts(make_reply):
+    probes = [Probe("::9", 24000, 33434, ttl, "icmp6") for ttl in (1, 2)]
+    replies = [
+        make_reply(58, "::9", 24000, 33434, 1, "::1"),
+        make_reply(58, "::9", 24000, 33434, 1, "::1"),
+        make_reply(58, "::9", 24000, 33434, 2, "::2"),
+        make_reply(58, "::9", 24000, 33434, 3, "::3"),
+    ]
+    assert get_reply_counts(probes, replies) == (1, 1)
+
+
+def test_get_ttl_metrics(make_reply):
+    alg = DiamondMiner("::9", 1, 8, 24000, 33434, "icmp", 95, 1, initial_max_ttl=2)
+    alg.next_round([])
+    replies = [
+        make_reply(58, "::9", 24000, 33434, ttl, f"::{ttl}") for ttl in range(1, 4)
+    ]
+    assert not alg.next_round(replies)
+    probes_sent = dict(alg.probes_sent)
+    metrics = get_ttl_metrics([alg])
+    assert metrics[1] == dict(
+        links=1, probes=1, budget=6, converged=0, per_packet=0, rate_limited=0
+    )
+    assert metrics[3]["probes"] == 0
+    # Collecting the metrics does not change the state of the algorithm.
+    assert dict(alg.probes_sent) == probes_sent
+
+
+def test_get_ttl_metrics_mda_lite(make_reply):
+    alg = MDALite("::9", 1, 8, 24000, 33434, "icmp", 95, 10, initial_max_ttl=3)
+    alg.next_round([])
+    replies = []
+    for flow, (near_addr, far_addr) in enumerate(
+        [("::2:1", "::3:1"), ("::2:1", "::3:2"), ("::2:2", "::3:2")]
+    ):
+        replies.append(make_reply(58, "::9", 24000 + flow, 33434, 1, "::1"))
+        replies.append(make_reply(58, "::9", 24000 + flow, 33434, 2, near_addr))
+        replies.append(make_reply(58, "::9", 24000 + flow, 33434, 3, far_addr))
+    alg.next_round(replies)
+    assert alg.meshed_ttls == {2}
+    # The budgets of the last round are reported, the meshing test is not run again.
+    alg.meshed_ttls.clear()
+    metrics = get_ttl_metrics([alg])
+    assert not alg.meshed_ttls
+    assert {ttl: x["budget"] for ttl, x in metrics.items()} == alg.round_budgets
@@ -0,0 +1,38 @@
+import json
+from datetime import datetime
+
+from fast_mda_traceroute.checkpoint import Checkpoint
+from fast_mda_traceroute.formats import format_scamper_json
+from fast_mda_traceroute.prior import load_prior_links
+from fast_mda_traceroute.simulator import Topology
+from fast_mda_traceroute.typing import Protocol
+
+
+def test_load_prior_links_checkpoint(tmp_path, simulate):
+    checkpoint = Checkpoint(tmp_path / "checkpoint.jsonl")
+    alg, _ = simulate(Topology.diamond(2, 2), checkpoint=checkpoint)
+    assert load_prior_links(checkpoint.path) == {"192.0.2.1": alg.links_by_ttl}
+
+
+def test_load_prior_links_scamper_json(tmp_path, simulate):
+    alg, _ = simulate(Topology.diamond(2, 2))
+    now = datetime.now()
+    objs = format_scamper_json(
+        95,
+        100,
+        "localhost",
+        "192.0.2.0",
+        "192.0.2.1",
+        Protocol.ICMP,
+        1,
+        24000,
+        33434,
+        1000,
+        now,
+        now,
+        alg.probes_sent,
+        alg.time_exceeded_replies,
+    )
+    path = tmp_path / "output.jsonl"
+    path.write_text("\n".join(json.dumps(obj) for obj in objs))
+    assert load_prior_links(path) == {"192.0.2.1": alg.links_by_ttl}
@@ -0,0 +1,54 @@
+from diamond_miner.generators import probe_generator
+from diamond_miner.mappers import SequentialFlowMapper
+
+from fast_mda_traceroute.checkpoint import format_probe
+from fast_mda_traceroute.flows import MultiFlowMapper
+from fast_mda_traceroute.probes import build_probes, schedule_flows
+from fast_mda_traceroute.replies import unpack_addr
+
+
+def test_build_probes():
+    mapper = MultiFlowMapper(src_port_count=100)
+    flows_by_ttl = {1: range(0, 3), 2: range(2, 6), 3: range(0)}
+    flows = schedule_flows(flows_by_ttl)
+    probes = build_probes("192.0.2.1", "icmp", 24000, 33434, flows, mapper)
+    assert [(x.ttl, x.src_port - 24000) for x in probes] == flows
+    expected = [
+        (unpack_addr(addr), src_port, dst_port, ttl, protocol)
+        for ttl, flows in flows_by_ttl.items()
+        for addr, src_port, dst_port, ttl, protocol in probe_generator(
+            [("192.0.2.1", "icmp")],
+            flow_ids=flows,
+            ttls=[ttl],
+            prefix_len_v4=32,
+            probe_src_port=24000,
+            probe_dst_port=33434,
+            mapper_v4=SequentialFlowMapper(prefix_size=1),
+        )
+    ]
+    assert sorted(format_probe(x) for x in probes) == sorted(expected)
+    assert build_probes("::1", "icmp6", 24000, 33434, [], mapper) == []
+
+
+def test_build_probes_dst_ports():
+    mapper = MultiFlowMapper(src_port_count=2, dst_port_count=2)
+    flows = [(1, flow_id) for flow_id in range(4)]
+    probes = build_probes("::1", "udp", 24000, 33434, flows, mapper)
+    assert sorted((x.src_port, x.dst_port) for x in probes) == [
+        (24000, 33434),
+        (24000, 33435),
+        (24001, 33434),
+        (24001, 33435),
+    ]
+
+
+def test_schedule_flows():
+    flows_by_ttl = {1: range(4), 2: [0, 5], 3: range(8)}
+    flows = schedule_flows(flows_by_ttl, {1, 2})
+    assert sorted(flows) == sorted(
+        (ttl, flow_id) for ttl, flow_ids in flows_by_ttl.items() for flow_id in flow_ids
+    )
+    # The flows of the paced TTLs are evenly spaced, in order.
+    assert [i for i, x in enumerate(flows) if x[0] == 1] == [1, 5, 8, 12]
+    assert [x for x in flows if x[0] == 1] == [(1, 0), (1, 1), (1, 2), (1, 3)]
+    assert [x for x in flows if x[0] == 2] == [(2, 0), (2, 5)]
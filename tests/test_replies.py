@@ -0,0 +1,52 @@
+from fast_mda_traceroute.formats import format_table, format_traceroute
+from fast_mda_traceroute.links import get_links_by_ttl, get_scamper_links
+from fast_mda_traceroute.replies import ReplyStore, pack_addr, unpack_addr
+
+FIELDS = (
+    "probe_protocol",
+    "probe_dst_addr",
+    "probe_src_port",
+    "probe_dst_port",
+    "probe_ttl",
+    "reply_src_addr",
+    "reply_icmp_type",
+    "rtt",
+    "time_exceeded",
+    "echo_reply",
+)
+
+
+def test_pack_addr():
+    for addr in ("8.8.8.8", "::", "::1", "2001:4860:4860::8888"):
+        assert unpack_addr(pack_addr(addr)) == addr
+
+
+def test_reply_store(make_reply):
+    replies = [
+        make_reply(1, "8.8.8.8", 24000, 33434, 1, "10.0.0.1", rtt=12),
+        make_reply(1, "8.8.8.8", 24000, 33434, 2, "8.8.8.8", reply_icmp_type=0),
+        make_reply(58, "2001:4860::8888", 24001, 33434, 1, "fd00::1"),
+    ]
+    store = ReplyStore(replies)
+    assert len(store) == 3
+    for reply, stored in zip(replies, store):
+        for field in FIELDS:
+            assert getattr(stored, field) == getattr(reply, field)
+    assert store[-1].reply_src_addr == "fd00::1"
+    assert [x.probe_ttl for x in store.time_exceeded()] == [1, 1]
+
+
+def test_reply_store_links(make_reply):
+    replies = [
+        make_reply(1, "::9", 24000, 33434, 1, "::1"),
+        make_reply(1, "::9", 24000, 33434, 2, "::2"),
+        make_reply(1, "::9", 24000, 33434, 3, "::3"),
+        make_reply(1, "::9", 24001, 33434, 1, "::1"),
+        make_reply(1, "::9", 24001, 33434, 3, "::3"),
+        make_reply(1, "::9", 24001, 33434, 3, "::3"),
+    ]
+    store = ReplyStore(replies)
+    assert get_links_by_ttl(store) == get_links_by_ttl(replies)
+    assert get_scamper_links(store).keys() == get_scamper_links(replies).keys()
+    assert format_table(store) == format_table(replies)
+    assert format_traceroute(store) == format_traceroute(replies)
@@ -0,0 +1,73 @@
+import json
+from io import StringIO
+
+from fast_mda_traceroute.formats import JSONStreamWriter
+from fast_mda_traceroute.simulator import Topology
+
+
+def test_run_batch(simulate):
+    topology = Topology.from_hops([["10.0.0.1"], ["10.0.0.2"], ["10.0.0.3"]])
+    algs, prober = simulate(
+        topology, dst_addrs=["192.0.2.1", "192.0.2.2"], max_ttl=4, wait=0
+    )
+    for alg in algs:
+        assert alg.links == topology.links
+        assert all(x.probe_dst_addr == alg.dst_addr for x in alg.replies)
+        assert list(alg.time_exceeded_replies) == list(alg.replies.time_exceeded())
+    assert prober.calls == 2
+
+
+def test_run_adaptive_wait(simulate):
+    topology = Topology.from_hops([["10.0.0.1"], ["10.0.0.2"], ["10.0.0.3"]], latency=5)
+    _, prober = simulate(topology, adaptive_wait=True)
+    # 2 * 30ms (95th percentile at TTL 3) + 50ms
+    assert prober.waits == [1000, 110]
+
+
+def test_run_json_stream(simulate):
+    topology = Topology.diamond(2, 2)
+    output = StringIO()
+    alg, _ = simulate(topology, on_round=JSONStreamWriter(output))
+    *rounds, summary = [json.loads(line) for line in output.getvalue().splitlines()]
+    links = set()
+    for record in rounds:
+        assert record["type"] == "round"
+        links |= {tuple(x) for x in record["links"]}
+        links -= {tuple(x) for x in record["removed_links"]}
+    assert links == alg.links
+    assert summary["type"] == "summary"
+    assert summary["links"] == len(alg.links)
+    assert summary["rounds"] == len(rounds)
+
+
+def test_run_metrics(simulate):
+    topology = Topology.diamond(2, 2)
+    metrics = []
+    algs, _ = simulate(
+        topology, dst_addrs=["192.0.2.1", "192.0.2.2"], on_metrics=metrics.append
+    )
+    assert [x["round"] for x in metrics] == list(range(1, len(metrics) + 1))
+    assert sum(x["replies"] for x in metrics) == sum(len(x.replies) for x in algs)
+    assert sum(x["probes"] for x in metrics) == sum(
+        sum(x.probes_sent.values()) + sum(x.probes_resent.values()) for x in algs
+    )
+    assert all(x["duplicate_replies"] == x["unmatched_replies"] == 0 for x in metrics)
+    assert metrics[-1]["probes"] == 0
+    assert all(x["send_time"] >= 0 and x["wait_time"] >= 0 for x in metrics)
+    assert all(x["converged"] == 2 for x in metrics[-1]["ttls"].values())
+
+
+def test_run_prefix(simulate):
+    topology = Topology.diamond(4, 2)
+    alg, prober = simulate(topology, prefix_len=24)
+    assert alg.dst_addr == "192.0.2.0"
+    assert alg.links == topology.links
+    links_by_dst = alg.links_by_dst()
+    assert len(links_by_dst) > 1
+    assert set().union(*links_by_dst.values()) == alg.links
+    probes_sent_by_dst = alg.probes_sent_by_dst()
+    probes_sent = sum(sum(x.values()) for x in probes_sent_by_dst.values())
+    assert probes_sent + sum(alg.probes_resent.values()) == prober.probes_sent
+    # The whole prefix is traced with about as many probes as a single address.
+    _, single_prober = simulate(topology)
+    assert prober.probes_sent <= 2 * single_prober.probes_sent
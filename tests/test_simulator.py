@@ -0,0 +1,65 @@
+from pycaracal import Probe
+
+from fast_mda_traceroute.simulator import SimulatedProber, Topology
+
+
+def test_topology_diamond():
+    topology = Topology.diamond(2, 1)
+    assert topology.links == {
+        (1, "10.0.0.1", "10.1.0.0"),
+        (1, "10.0.0.1", "10.1.0.1"),
+        (2, "10.1.0.0", "10.2.0.1"),
+        (2, "10.1.0.1", "10.2.0.1"),
+    }
+
+
+def test_topology_unmeshed():
+    topology = Topology.from_hops(
+        [["a"], ["b", "c"], ["d", "e", "f", "g"]], meshed=False
+    )
+    assert topology.successors == {
+        "": ["a"],
+        "a": ["b", "c"],
+        "b": ["d", "f"],
+        "c": ["e", "g"],
+    }
+
+
+def test_simulated_prober():
+    topology = Topology.from_hops(
+        [["10.0.0.1"], ["10.0.0.2"]], unresponsive=["10.0.0.2"], latency=10
+    )
+    prober = SimulatedProber(topology)
+    probes = [Probe("192.0.2.1", 24000, 33434, ttl, "icmp") for ttl in range(1, 5)]
+    replies = prober.probe(probes, 1000)
+    assert [x.reply_src_addr for x in replies] == ["10.0.0.1", "192.0.2.1", "192.0.2.1"]
+    assert [x.time_exceeded for x in replies] == [True, False, False]
+    assert [x.echo_reply for x in replies] == [False, True, True]
+    assert [x.rtt for x in replies] == [200, 600, 600]
+    assert prober.time == 1.04
+
+
+def test_simulated_prober_per_flow():
+    topology = Topology.diamond(8, 1)
+    prober = SimulatedProber(topology)
+    probes = [Probe("192.0.2.1", 24000, 33434, 2, "icmp") for _ in range(10)]
+    assert len({x.reply_src_addr for x in prober.probe(probes, 0)}) == 1
+    topology = Topology.diamond(8, 1, per_packet=["10.0.0.1"])
+    prober = SimulatedProber(topology)
+    assert len({x.reply_src_addr for x in prober.probe(probes, 0)}) > 1
+
+
+def test_simulated_prober_rate_limit():
+    topology = Topology.from_hops([["10.0.0.1"]], rate_limits={"10.0.0.1": 10})
+    prober = SimulatedProber(topology, probing_rate=100)
+    probes = [Probe("192.0.2.1", 24000 + i, 33434, 1, "icmp") for i in range(100)]
+    # A burst of 10 replies, then 10 replies per second during 0.99s.
+    assert len(prober.probe(probes, 0)) == 19
+
+
+def test_simulated_prober_wait():
+    topology = Topology.from_hops([["10.0.0.1"]], latency=100)
+    prober = SimulatedProber(topology, probing_rate=100)
+    probes = [Probe("192.0.2.1", 24000 + i, 33434, 1, "icmp") for i in range(10)]
+    # The last probe is sent at 90ms, the replies arrive 200ms after being sent.
+    assert len(prober.probe(probes, 150)) == 6